@@ -1,14 +1,26 @@
-import os, time
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from trenddrop.utils.env_loader import load_env_once
+from trenddrop.utils.env_loader import load_env_once, env_flag
 from typing import List, Dict
 
 # Load environment variables only from root .env
 ENV_PATH = load_env_once()
 from utils.trends import top_topics
-from utils.sources import search_ebay
+from utils.sources import search_ebay, cache_stats
+from utils.ebay_browse import DEFAULT_MARKETPLACE, set_rate_limit
+from utils.ebay_budget import budget_status
 from utils.epn import affiliate_wrap
 from utils.publish import update_storefront, post_telegram
+from utils.topk import TopK
+from utils.scoring import score_batch
+from utils.neardup import collapse_near_duplicates
+from utils.phash import dedupe_by_image, image_hashes
+from utils.classify import classify_products
+from utils.seen import SeenIndex, seen_enabled
+from utils.ai_cache import cache_stats as ai_cache_stats
+from utils.image_cache import cache_stats as image_cache_stats
 
 def _get_int_env(name: str, default: int) -> int:
     try:
@@ -38,63 +50,114 @@ def _get_float_env_between(name: str, default: float, min_value: float, max_valu
         return max_value
     return val
 
-def score(p: Dict) -> float:
-    base = 0.0
-    base += (p.get("top_rated", False) * 5)
-    base += min(p.get("seller_feedback", 0)/1000, 5)
-    price = p.get("price", 0.0)
-    if price > 0:
-        if 15 <= price <= 150: base += 4
-        elif 5 <= price < 15: base += 2
-        elif 150 < price <= 400: base += 1
-    return base
+def _request_rate(sleep_secs: float, marketplace: str = "") -> float:
+    """Requests/second for a limiter; TREND_RPS_<MARKETPLACE> / TREND_RPS win, else derived from TREND_SLEEP_SECS."""
+    if marketplace:
+        rps = _get_float_env(f"TREND_RPS_{marketplace}", 0.0)
+        if rps > 0:
+            return rps
+    rps = _get_float_env("TREND_RPS", 0.0)
+    if rps > 0:
+        return rps
+    return (1.0 / sleep_secs) if sleep_secs > 0 else 0.0
 
-def dedupe(products: List[Dict]) -> List[Dict]:
-    seen, out = set(), []
-    for p in products:
-        key = p.get("url")
-        if key and key not in seen:
-            seen.add(key); out.append(p)
-    return out
+def _marketplaces() -> List[str]:
+    raw = os.environ.get("TREND_MARKETPLACES") or DEFAULT_MARKETPLACE
+    out = [m.strip().upper() for m in raw.split(",") if m.strip()]
+    return list(dict.fromkeys(out)) or [DEFAULT_MARKETPLACE]
+
+def _fetch_topic(topic: str, per_page: int, marketplace: str) -> List[Dict]:
+    # pacing happens per live Browse request (utils.ebay_browse), so cache hits return at once
+    return search_ebay(topic, per_page=per_page, marketplace=marketplace)
+
+def _prepare_found(found: List[Dict], topic: str, marketplace: str) -> List[Dict]:
+    for item, s in zip(found, score_batch(found)):
+        item["score"] = s
+        item["tags"] = [topic]
+        item["marketplace"] = marketplace
+        item["url"] = affiliate_wrap(item["url"], custom_id=topic.replace(" ", "_")[:40], marketplace=marketplace)
+    classify_products(found)
+    return found
 
 def main():
     topics_limit = _get_int_env("TREND_TOPICS_LIMIT", 1)
     per_page = _get_int_env("TREND_PER_PAGE", 5)
     sleep_secs = _get_float_env("TREND_SLEEP_SECS", 5.0)
     sleep_jitter = _get_float_env_between("TREND_SLEEP_JITTER", 0.0, 0.0, 10.0)
+    concurrency = max(1, _get_int_env("TREND_CONCURRENCY", 4))
+    burst = _get_float_env("TREND_RPS_BURST", float(concurrency))
     picks_limit = _get_int_env("TREND_PICKS_LIMIT", 5)
     telegram_limit = _get_int_env("TREND_TELEGRAM_LIMIT", 5)
+    marketplaces = _marketplaces()
 
-    topics = top_topics(limit=topics_limit)
+    topics = top_topics(limit=topics_limit, geo=os.environ.get("TREND_GEOS") or "US")
     print(f"[bot] topics: {topics}")
-    candidates: List[Dict] = []
-    for i, t in enumerate(topics):
-        try:
-            found = search_ebay(t, per_page=per_page)
-            print(f"[bot] found {len(found)} for topic '{t}'")
-            for item in found:
-                item["score"] = score(item)
-                item["tags"] = [t]
-                item["url"] = affiliate_wrap(item["url"], custom_id=t.replace(" ", "_")[:40])
-            candidates += found
-        except Exception as e:
-            print(f"[bot] WARN search failed '{t}': {e}")
-        # optional jitter to desynchronize bursts
-        if sleep_secs > 0:
-            jitter = 0.0
-            try:
-                import random
-                jitter = random.uniform(0.0, sleep_jitter) if sleep_jitter > 0 else 0.0
-            except Exception:
-                jitter = 0.0
-            time.sleep(sleep_secs + jitter)  # configurable pause between calls
+    # each marketplace gets its own limiter (and cache namespace in utils.sources)
+    limiters = {m: set_rate_limit(m, _request_rate(sleep_secs, m), burst=burst, jitter_max=sleep_jitter)
+                for m in marketplaces}
+    for m, lim in limiters.items():
+        print(f"[bot] {m}: concurrency={concurrency} rps={lim.rate:.2f} burst={burst:g}")
+    # candidates stream through URL dedupe into a bounded top-K heap; it is
+    # over-sampled so near-duplicate/image dedupe can still fill `picks_limit`
+    neardup = env_flag("TREND_NEARDUP", True)
+    image_dedupe = env_flag("TREND_IMAGE_DEDUPE", True)
+    oversample = max(1, _get_int_env("TREND_NEARDUP_OVERSAMPLE", 4)) if (neardup or image_dedupe) else 1
+    top = TopK(picks_limit * oversample)
+    # listings posted in earlier runs (within SEEN_TTL_HOURS) never reach the heap
+    seen = SeenIndex() if seen_enabled() else None
+    try:
+        skipped_seen = 0
+        with ThreadPoolExecutor(max_workers=concurrency * len(marketplaces)) as pool:
+            futures = deque(
+                (t, m, pool.submit(_fetch_topic, t, per_page, m))
+                for t in topics for m in marketplaces
+            )
+            # consume in submission order so tie-breaking stays deterministic;
+            # popping drops each finished result as soon as it has been offered
+            while futures:
+                t, m, fut = futures.popleft()
+                try:
+                    found = fut.result()
+                    print(f"[bot] found {len(found)} for topic '{t}' ({m})")
+                    found = _prepare_found(found, t, m)
+                    if seen is not None:
+                        fresh = seen.filter_unseen(found)
+                        skipped_seen += len(found) - len(fresh)
+                        found = fresh
+                    for item in found:
+                        top.offer(item, item.get("score", 0.0))
+                except Exception as e:
+                    print(f"[bot] WARN search failed '{t}' ({m}): {e}")
 
-    candidates = dedupe(candidates)
-    picks = sorted(candidates, key=lambda x: x.get("score", 0.0), reverse=True)[:picks_limit]
-    print(f"[bot] candidates={len(candidates)} picks={len(picks)}")
-    update_storefront(picks)
-    post_telegram(picks, limit=telegram_limit)
-    print(f"[bot] posted {len(picks)} items from {len(topics)} topics")
+        picks = top.items()
+        if neardup:
+            picks = collapse_near_duplicates(picks)
+        if image_dedupe:
+            # same stock photo under a different title/URL, in this run or a recent one
+            posted = seen.image_hashes() if seen is not None else None
+            picks = dedupe_by_image(picks, posted=posted)
+        picks = picks[:picks_limit]
+        print(f"[bot] candidates={top.distinct} picks={len(picks)} already_posted={skipped_seen}")
+        print(f"[bot] ebay cache: {cache_stats()} budget: {budget_status()}")
+        if not picks:
+            # keep the current storefront rather than publishing an empty one
+            print("[bot] nothing new to post")
+            return
+        update_storefront(picks)
+        print(f"[bot] ai copy cache: {ai_cache_stats()} image cache: {image_cache_stats()}")
+        post_telegram(picks, limit=telegram_limit)
+        if seen is not None:
+            try:
+                # hashes come from the phash cache that dedupe_by_image just filled
+                hashes = image_hashes([p.get("image_url") or "" for p in picks]) if image_dedupe else None
+                seen.mark(picks, image_hashes=hashes)
+                seen.prune()
+            except Exception as e:
+                print(f"[bot] WARN seen index update failed: {e}")
+        print(f"[bot] posted {len(picks)} items from {len(topics)} topics")
+    finally:
+        if seen is not None:
+            seen.close()
     
 if __name__ == "__main__":
     main()
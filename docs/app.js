@@ -1,43 +1,157 @@
+// Catalog layout (see utils/site_data.py): data/index.json lists page and tag
+// shards with their content versions. The index is revalidated on every load;
+// shards are fetched with ?v=<version> so unchanged ones come from the HTTP cache.
+// Falls back to the single data/products.json when no index is published.
+// `seq` numbers each grid load; a response that is no longer the latest is dropped
+const state = { index: null, nextPage: 0, tag: null, seq: 0 };
+
+function renderCard(p){
+  const card = document.createElement('div');
+  card.className = 'card';
+  const img = document.createElement('img');
+  img.src = p.image_url || '';
+  img.alt = p.title || '';
+  img.loading = 'lazy';
+  const pad = document.createElement('div');
+  pad.className = 'pad';
+  const h3 = document.createElement('h3');
+  h3.textContent = (p.headline || p.title || '');
+  const blurb = document.createElement('p');
+  blurb.className = 'blurb';
+  blurb.textContent = (p.blurb || '');
+  const price = document.createElement('div');
+  price.className = 'price';
+  const pr = (typeof p.price === 'number' && p.currency) ? `${p.currency} ${p.price.toFixed(2)}` : '';
+  price.textContent = pr;
+  const a = document.createElement('a');
+  a.className = 'btn';
+  a.href = (p.click_url || p.url || '#');
+  a.target = '_blank';
+  a.rel = 'nofollow sponsored noopener';
+  a.textContent = 'View';
+  pad.appendChild(h3);
+  if (blurb.textContent) pad.appendChild(blurb);
+  pad.appendChild(price);
+  pad.appendChild(a);
+  card.appendChild(img);
+  card.appendChild(pad);
+  return card;
+}
+
+function renderProducts(products, append){
+  const grid = document.getElementById('grid');
+  if (!append) grid.innerHTML = '';
+  const frag = document.createDocumentFragment();
+  (products || []).forEach(p => frag.appendChild(renderCard(p)));
+  grid.appendChild(frag);
+}
+
+async function fetchShard(entry){
+  const res = await fetch(`data/${entry.path}?v=${encodeURIComponent(entry.version)}`);
+  if (!res.ok) throw new Error(`shard ${entry.path}: ${res.status}`);
+  return res.json();
+}
+
+function updateLoadMore(){
+  const btn = document.getElementById('loadMore');
+  if (!btn) return;
+  const more = !state.tag && state.index && state.nextPage < state.index.pages.length;
+  btn.hidden = !more;
+}
+
+async function loadNextPage(){
+  const pages = (state.index && state.index.pages) || [];
+  if (state.nextPage >= pages.length) return;
+  const seq = ++state.seq;
+  const entry = pages[state.nextPage];
+  const data = await fetchShard(entry);
+  if (seq !== state.seq) return;
+  renderProducts(data.products, state.nextPage > 0);
+  state.nextPage += 1;
+  updateLoadMore();
+}
+
+async function showTag(tag){
+  state.tag = tag;
+  document.querySelectorAll('#tags .chip').forEach(el => {
+    el.classList.toggle('active', (el.dataset.tag || null) === tag);
+  });
+  if (!tag){
+    state.nextPage = 0;
+    await loadNextPage();
+    return;
+  }
+  const entry = (state.index.tags || []).find(t => t.tag === tag);
+  if (!entry) return;
+  const seq = ++state.seq;
+  const data = await fetchShard(entry);
+  if (seq !== state.seq) return;
+  renderProducts(data.products, false);
+  updateLoadMore();
+}
+
+function renderTags(tags){
+  const box = document.getElementById('tags');
+  if (!box || !tags || tags.length < 2) return;
+  box.innerHTML = '';
+  const chip = (label, tag) => {
+    const b = document.createElement('button');
+    b.type = 'button';
+    b.className = 'chip' + (tag === null ? ' active' : '');
+    if (tag !== null) b.dataset.tag = tag;
+    b.textContent = label;
+    b.addEventListener('click', () => showTag(tag).catch(console.error));
+    box.appendChild(b);
+  };
+  chip('All', null);
+  tags.forEach(t => chip(`${t.tag} (${t.count})`, t.tag));
+}
+
+function setUpdated(updatedAt){
+  const updated = document.getElementById('updated_at');
+  const ts = updatedAt ? new Date(updatedAt * 1000) : new Date();
+  updated.textContent = ts.toLocaleString();
+}
+
+async function loadLegacy(){
+  // revalidate with the server (ETag) instead of cache-busting; unchanged data costs a 304
+  const res = await fetch('data/products.json', {cache: 'no-cache'});
+  const data = await res.json();
+  renderProducts(data.products, false);
+  setUpdated(data.updated_at);
+}
+
 async function loadProducts(){
   try{
-    const res = await fetch('data/products.json?cache=' + Date.now());
-    const data = await res.json();
-    const grid = document.getElementById('grid');
-    grid.innerHTML = '';
-    (data.products || []).forEach(p => {
-      const card = document.createElement('div');
-      card.className = 'card';
-      const img = document.createElement('img');
-      img.src = p.image_url || '';
-      img.alt = p.title || '';
-      const pad = document.createElement('div');
-      pad.className = 'pad';
-      const h3 = document.createElement('h3');
-      h3.textContent = (p.headline || p.title || '');
-      const blurb = document.createElement('p');
-      blurb.className = 'blurb';
-      blurb.textContent = (p.blurb || '');
-      const price = document.createElement('div');
-      price.className = 'price';
-      const pr = (p.price !== undefined && p.currency) ? `${p.currency} ${p.price.toFixed(2)}` : '';
-      price.textContent = pr;
-      const a = document.createElement('a');
-      a.className = 'btn';
-      a.href = (p.click_url || p.url || '#');
-      a.target = '_blank';
-      a.rel = 'nofollow sponsored noopener';
-      a.textContent = 'View';
-      pad.appendChild(h3);
-      if (blurb.textContent) pad.appendChild(blurb);
-      pad.appendChild(price);
-      pad.appendChild(a);
-      card.appendChild(img);
-      card.appendChild(pad);
-      grid.appendChild(card);
-    });
-    const updated = document.getElementById('updated_at');
-    const ts = data.updated_at ? new Date(data.updated_at * 1000) : new Date();
-    updated.textContent = ts.toLocaleString();
+    let index = null;
+    try{
+      const res = await fetch('data/index.json', {cache: 'no-cache'});
+      if (res.ok) index = await res.json();
+    }catch(e){
+      index = null;
+    }
+    let sharded = false;
+    if (index && Array.isArray(index.pages)){
+      state.index = index;
+      try{
+        await loadNextPage();
+        sharded = true;
+      }catch(e){
+        // first shard missing (partial Pages deploy) or unreachable: use the single-file copy
+        console.error(e);
+        state.index = null;
+        state.nextPage = 0;
+      }
+    }
+    if (sharded){
+      renderTags(index.tags);
+      setUpdated(index.updated_at);
+      const btn = document.getElementById('loadMore');
+      if (btn) btn.addEventListener('click', () => loadNextPage().catch(console.error));
+    } else {
+      await loadLegacy();
+      updateLoadMore();
+    }
     document.getElementById('year').textContent = new Date().getFullYear();
 
     // Premium button wiring (set via env var on the page if added)
@@ -4,6 +4,8 @@ import os
 import json
 from pathlib import Path
 
+from trenddrop.utils import transport
+
 
 TEMPLATE = (
     "Generate 10 short, high-conversion hooks for a weekly product trend report. "
@@ -37,9 +39,8 @@ def main() -> int:
         ]
     else:
         try:
-            import requests
             prompt = TEMPLATE
-            r = requests.post(
+            r = transport.post(
                 "https://api.openai.com/v1/chat/completions",
                 headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
                 json={
@@ -3,7 +3,6 @@ import pathlib
 from pathlib import Path
 import time
 from typing import List, Dict, Tuple
-import re
 from urllib.parse import urlparse, urlunparse
 
 from utils.report import (
@@ -12,8 +11,11 @@ from utils.report import (
     write_csv,
 )
 from trenddrop.utils.supabase_upload import upload_file
-from trenddrop.utils.env_loader import load_env_once
+from trenddrop.utils.env_loader import load_env_once, env_flag
 from utils.db import sb
+from utils.scoring import score_batch, rank
+from utils.neardup import normalize_title, collapse_near_duplicates
+from utils.classify import classify_products, classifier
 ENV_PATH = load_env_once()
 
 
@@ -103,14 +105,6 @@ def main() -> None:
         clean = clean._replace(netloc=netloc)
         return urlunparse(clean)
 
-    def _normalize_title(t: str | None) -> str:
-        if not t:
-            return ""
-        t = t.lower()
-        t = re.sub(r"\s+", " ", t)
-        t = re.sub(r"[^\w\s]+", "", t)
-        return t.strip()
-
     def _dedupe(items: List[Dict], prefer_key: str = "seller_feedback") -> List[Dict]:
         seen: Dict[Tuple[str, str], Dict] = {}
         order: List[Tuple[str, str]] = []
@@ -126,7 +120,7 @@ def main() -> None:
             if key_url:
                 key = ("url", key_url)
             else:
-                key = ("title_price", f"{_normalize_title(r.get('title'))}|{r.get('price')}")
+                key = ("title_price", f"{normalize_title(r.get('title'))}|{r.get('price')}")
             if key not in seen:
                 seen[key] = r
                 order.append(key)
@@ -134,36 +128,6 @@ def main() -> None:
                 seen[key] = choose(seen[key], r)
         return [seen[k] for k in order]
 
-    def _score_balanced(p: Dict) -> float:
-        score = 0.0
-        # Top rated sellers get a boost
-        if p.get("top_rated"):
-            score += 5.0
-        # Normalize feedback roughly to 0..5
-        try:
-            score += min(float(p.get("seller_feedback") or 0) / 1000.0, 5.0)
-        except Exception:
-            pass
-        # Favor prices in mid-range
-        price = p.get("price")
-        try:
-            price = float(price)
-            if 15 <= price <= 150:
-                score += 4.0
-            elif 5 <= price < 15:
-                score += 2.0
-            elif 150 < price <= 400:
-                score += 1.0
-        except Exception:
-            pass
-        # Optional signals field if available
-        try:
-            sig = float(p.get("signals") or 0)
-            score += min(sig / 1000.0, 5.0)
-        except Exception:
-            pass
-        return score
-
     def _sort_items(items: List[Dict], strategy: str) -> List[Dict]:
         if strategy == "seller_feedback":
             return sorted(items, key=lambda x: x.get("seller_feedback") or 0, reverse=True)
@@ -174,11 +138,22 @@ def main() -> None:
         if strategy == "price_high":
             return sorted(items, key=lambda x: (x.get("price") or 0), reverse=True)
         # balanced
-        return sorted(items, key=_score_balanced, reverse=True)
+        return rank(items, score_batch(items))
 
     products = _dedupe(products)
+    # collapse near-identical listings (same product, many resellers) to their best-scored member
+    if env_flag("REPORT_NEARDUP", True):
+        before = len(products)
+        products = collapse_near_duplicates(products, score_batch(products))
+        print(f"[reports] near-duplicate collapse {before} -> {len(products)}")
     strategy = _get_env("REPORT_SORT_STRATEGY", "balanced") or "balanced"
     products = _sort_items(products, strategy)[:max_items]
+    # rule-based category per product (usable as a "category" column)
+    classify_products(products)
+    if (_get_env("REPORT_GROUP_BY", "") or "").lower() == "category":
+        # taxonomy order; stable sort keeps the ranking inside each group
+        order = {name: i for i, name in enumerate(classifier().names)}
+        products = sorted(products, key=lambda p: order.get(p.get("category"), len(order)))
     if not products:
         print("[reports] no products found; exiting")
         return
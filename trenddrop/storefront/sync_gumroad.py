@@ -3,6 +3,8 @@ from __future__ import annotations
 import os
 from pathlib import Path
 
+from trenddrop.utils import transport
+
 
 def _get(key: str) -> str | None:
     v = os.environ.get(key)
@@ -26,16 +28,14 @@ def main() -> int:
     # Best-effort: update product content/fields with latest URLs via report-links
     signed_urls: dict[str, str] = {}
     try:
-        import requests
         supa = _get("SUPABASE_URL")
         svc = _get("SUPABASE_SERVICE_ROLE_KEY")
         if supa and svc:
             for fmt in ("pdf", "csv"):
-                r = requests.post(
+                r = transport.post(
                     f"{supa}/functions/v1/report-links",
                     headers={"authorization": f"Bearer {svc}"},
                     json={"mode": "weekly", "format": fmt},
-                    timeout=20,
                 )
                 if r.ok:
                     signed_urls[fmt] = r.json().get("url") or ""
@@ -50,11 +50,10 @@ def main() -> int:
 
         payload = {"product_id": product, "description": desc}
         # Gumroad API is limited; many edits require dashboard; we best-effort store links
-        r2 = requests.post(
+        r2 = transport.post(
             "https://api.gumroad.com/v2/products/" + product,
             data=payload,
             headers={"Authorization": f"Bearer {token}"},
-            timeout=20,
         )
         if not r2.ok:
             print(f"[sync_gumroad] update failed: {r2.status_code} {r2.text}")
@@ -3,6 +3,8 @@ from __future__ import annotations
 import os
 from pathlib import Path
 
+from trenddrop.utils import transport
+
 
 def _get(key: str) -> str | None:
     v = os.environ.get(key)
@@ -25,15 +27,14 @@ def main() -> int:
 
     # Best-effort link update (Payhip API is limited; we store description links)
     try:
-        import requests
         supa = _get("SUPABASE_URL")
         svc = _get("SUPABASE_SERVICE_ROLE_KEY")
         signed_pdf = signed_csv = None
         if supa and svc:
-            r1 = requests.post(f"{supa}/functions/v1/report-links", headers={"authorization": f"Bearer {svc}"}, json={"mode": "weekly", "format": "pdf"}, timeout=20)
+            r1 = transport.post(f"{supa}/functions/v1/report-links", headers={"authorization": f"Bearer {svc}"}, json={"mode": "weekly", "format": "pdf"})
             if r1.ok:
                 signed_pdf = r1.json().get("url")
-            r2 = requests.post(f"{supa}/functions/v1/report-links", headers={"authorization": f"Bearer {svc}"}, json={"mode": "weekly", "format": "csv"}, timeout=20)
+            r2 = transport.post(f"{supa}/functions/v1/report-links", headers={"authorization": f"Bearer {svc}"}, json={"mode": "weekly", "format": "csv"})
             if r2.ok:
                 signed_csv = r2.json().get("url")
 
@@ -6,6 +6,8 @@ import json
 from pathlib import Path
 from typing import Optional
 
+from trenddrop.utils import transport
+
 
 def _get(key: str) -> Optional[str]:
     v = os.environ.get(key)
@@ -48,13 +50,11 @@ def main() -> int:
         supa_url = _get("SUPABASE_URL")
         svc = _get("SUPABASE_SERVICE_ROLE_KEY")
         if supa_url and svc:
-            import requests
             for fmt, _p in files:
-                r = requests.post(
+                r = transport.post(
                     f"{supa_url}/functions/v1/report-links",
                     headers={"authorization": f"Bearer {svc}", "content-type": "application/json"},
                     json={"mode": "weekly", "format": fmt},
-                    timeout=20,
                 )
                 if r.ok:
                     signed_urls[fmt] = r.json().get("url") or ""
@@ -63,14 +63,12 @@ def main() -> int:
 
     # Update Stripe product metadata (no upload of files; point to storage URLs)
     try:
-        import requests
         meta = {f"latest_{k}_url": v for k, v in signed_urls.items() if v}
         data = {"metadata": meta, "description": description}
-        r = requests.post(
+        r = transport.post(
             f"https://api.stripe.com/v1/products/{product_id}",
             data=data,
             headers={"Authorization": f"Bearer {secret}"},
-            timeout=20,
         )
         if not r.ok:
             print(f"[sync_stripe] stripe update failed: {r.status_code} {r.text}")
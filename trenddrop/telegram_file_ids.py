@@ -0,0 +1,102 @@
+import os, time, hashlib, sqlite3, threading
+from typing import Dict, List, Optional
+
+from trenddrop.utils.env_loader import env_flag
+
+# Telegram returns a file_id for every photo it has stored; sending that id
+# again skips the upstream fetch/upload and reprocessing. file_ids are only
+# valid for the bot that received them, so entries are keyed by (bot id, key)
+# where key is "url:<image url>" or "sha256:<digest of uploaded bytes>".
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+_DEFAULT_PATH = os.path.join(_ROOT_DIR, ".cache", "telegram", "file_ids.sqlite")
+
+
+def url_key(url: str) -> str:
+    return f"url:{url}"
+
+
+def bytes_key(data: bytes) -> str:
+    return f"sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+def bot_id_from_token(token: str) -> str:
+    return (token or "").split(":", 1)[0]
+
+
+def photo_file_id(message: Optional[Dict]) -> Optional[str]:
+    """file_id of the largest size in a sent Message's `photo` array."""
+    sizes = (message or {}).get("photo") or []
+    if not sizes:
+        return None
+    return sizes[-1].get("file_id")
+
+
+def is_bad_file_id(description: str) -> bool:
+    text = (description or "").lower()
+    return "file identifier" in text or "file_id" in text or "wrong remote file" in text
+
+
+class FileIdCache:
+    def __init__(self, path: str = _DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS file_ids ("
+            "bot_id TEXT NOT NULL, key TEXT NOT NULL, file_id TEXT NOT NULL, updated REAL NOT NULL, "
+            "PRIMARY KEY (bot_id, key)) WITHOUT ROWID"
+        )
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, bot_id: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT file_id FROM file_ids WHERE bot_id = ? AND key = ?", (bot_id, key)
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, bot_id: str, key: str, file_id: Optional[str]) -> None:
+        if not file_id:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO file_ids (bot_id, key, file_id, updated) VALUES (?, ?, ?, ?)",
+                (bot_id, key, file_id, time.time()),
+            )
+            self._db.commit()
+
+    def forget(self, bot_id: str, keys: List[str]) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM file_ids WHERE bot_id = ? AND key = ?", [(bot_id, k) for k in keys])
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_SHARED: Optional[FileIdCache] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def file_id_cache() -> Optional[FileIdCache]:
+    """Process-wide cache, or None when disabled (TELEGRAM_FILE_ID_CACHE=0) or unusable."""
+    global _SHARED
+    if not env_flag("TELEGRAM_FILE_ID_CACHE", True):
+        return None
+    with _SHARED_LOCK:
+        if _SHARED is None:
+            try:
+                _SHARED = FileIdCache()
+            except Exception as e:
+                print(f"[telegram] file_id cache unavailable: {e}")
+                return None
+        return _SHARED
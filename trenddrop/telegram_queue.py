@@ -0,0 +1,302 @@
+import os, json, copy, time, sqlite3, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from trenddrop.utils import transport
+from utils.ratelimit import TokenBucket
+from trenddrop.telegram_file_ids import file_id_cache, url_key, photo_file_id, is_bad_file_id
+from trenddrop.utils.env_loader import env_float
+
+# Outbox-backed Telegram sender.
+#
+# Messages are first written to a SQLite outbox (.cache/telegram/outbox.sqlite)
+# and deleted only once Telegram accepts them, so a crash, timeout or outage
+# leaves them for the next run instead of dropping them. flush() sends with one
+# worker per chat (chats are independent on Telegram's side) behind a global
+# token bucket (~30 msg/s per bot) and a per-chat bucket (1 msg/s for private
+# chats, 20 msg/min for groups/channels). 429 replies are retried after their
+# retry_after; 5xx and network errors back off exponentially. Photo URLs that
+# Telegram has seen before are sent as their cached file_id. A flush claims its
+# rows under a lease so overlapping runs never send the same message twice, and
+# dead rows are purged after TELEGRAM_OUTBOX_DEAD_TTL_DAYS.
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+_OUTBOX_PATH = os.path.join(_ROOT_DIR, ".cache", "telegram", "outbox.sqlite")
+
+
+def _is_group(chat_id: str) -> bool:
+    # channels/groups are negative ids or @usernames; private chats are positive ids
+    return chat_id.startswith("-") or chat_id.startswith("@")
+
+
+def _chat_bucket(chat_id: str) -> TokenBucket:
+    if _is_group(chat_id):
+        rpm = env_float("TELEGRAM_GROUP_RPM", 20.0)
+        return TokenBucket(rpm / 60.0, burst=env_float("TELEGRAM_GROUP_BURST", 3.0))
+    return TokenBucket(env_float("TELEGRAM_CHAT_RPS", 1.0), burst=1.0)
+
+
+class TelegramError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None, permanent: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
+
+
+class TelegramQueue:
+    def __init__(self, token: str, path: str = _OUTBOX_PATH):
+        self.api = f"https://api.telegram.org/bot{token}"
+        self.bot_id = token.split(":", 1)[0]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, bot_id TEXT NOT NULL, chat_id TEXT NOT NULL, "
+            "method TEXT NOT NULL, payload TEXT NOT NULL, cost INTEGER NOT NULL DEFAULT 1, "
+            "attempts INTEGER NOT NULL DEFAULT 0, next_at REAL NOT NULL, created REAL NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', last_error TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, bot_id, next_at)")
+        self._db.commit()
+        self._global = TokenBucket(env_float("TELEGRAM_GLOBAL_RPS", 30.0), burst=env_float("TELEGRAM_GLOBAL_BURST", 30.0))
+        self.stats = {"sent": 0, "retried": 0, "deferred": 0, "dead": 0, "expired": 0}
+        self._files = file_id_cache()
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    # ---- outbox ----
+
+    def enqueue(self, chat_id: str, method: str, payload: Dict, cost: int = 1) -> int:
+        """Persist a Bot API call; `cost` is how many messages it counts as against rate limits."""
+        now = time.time()
+        body = dict(payload)
+        body["chat_id"] = chat_id
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO outbox (bot_id, chat_id, method, payload, cost, next_at, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.bot_id, str(chat_id), method, json.dumps(body, ensure_ascii=False), int(cost), now, now),
+            )
+            self._db.commit()
+            return int(cur.lastrowid)
+
+    def claim(self, lease_secs: float) -> List[Dict]:
+        """
+        Take every due message for this run: status becomes 'sending' and next_at
+        the lease expiry, so an overlapping run skips them. Rows whose lease ran
+        out (a run that died mid-flush) are claimable again. Messages older than
+        TELEGRAM_OUTBOX_MAX_AGE_HOURS (6) are marked dead instead: after an
+        outage, stale deals and prices must not go out ahead of the new drop.
+        """
+        now = time.time()
+        max_age = env_float("TELEGRAM_OUTBOX_MAX_AGE_HOURS", 6.0) * 3600
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front: select + mark is atomic across processes
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if max_age > 0:
+                    expired = self._db.execute(
+                        "UPDATE outbox SET status = 'dead', last_error = 'expired before delivery' "
+                        "WHERE status IN ('pending', 'sending') AND bot_id = ? AND next_at <= ? AND created < ?",
+                        (self.bot_id, now, now - max_age),
+                    ).rowcount
+                    if expired:
+                        self.stats["expired"] += expired
+                        print(f"[telegram] {expired} outbox message(s) older than {max_age / 3600:g}h dropped")
+                rows = self._db.execute(
+                    "SELECT id, chat_id, method, payload, cost, attempts FROM outbox "
+                    "WHERE status IN ('pending', 'sending') AND bot_id = ? AND next_at <= ? ORDER BY id",
+                    (self.bot_id, now),
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE outbox SET status = 'sending', next_at = ? WHERE id = ?",
+                    [(now + lease_secs, r[0]) for r in rows],
+                )
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+        return [
+            {"id": r[0], "chat_id": r[1], "method": r[2], "payload": json.loads(r[3]), "cost": r[4], "attempts": r[5]}
+            for r in rows
+        ]
+
+    def _release(self, ids: List[int]) -> None:
+        """Hand claimed-but-unsent messages back to the outbox for the next run."""
+        with self._lock:
+            self._db.executemany(
+                "UPDATE outbox SET status = 'pending', next_at = ? WHERE id = ? AND status = 'sending'",
+                [(time.time(), i) for i in ids],
+            )
+            self._db.commit()
+
+    def prune(self) -> int:
+        """Delete dead messages older than TELEGRAM_OUTBOX_DEAD_TTL_DAYS (7); returns rows removed."""
+        cutoff = time.time() - env_float("TELEGRAM_OUTBOX_DEAD_TTL_DAYS", 7.0) * 86400
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM outbox WHERE status = 'dead' AND created < ?", (cutoff,)
+            ).rowcount
+            self._db.commit()
+        return removed
+
+    def _done(self, msg_id: int) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE id = ?", (msg_id,))
+            self._db.commit()
+
+    def _failed(self, msg: Dict, error: str, delay: float, permanent: bool) -> None:
+        attempts = msg["attempts"] + 1
+        dead = permanent or attempts >= int(env_float("TELEGRAM_OUTBOX_MAX_ATTEMPTS", 5))
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET attempts = ?, next_at = ?, status = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, "dead" if dead else "pending", error[:500], msg["id"]),
+            )
+            self._db.commit()
+        self._bump("dead" if dead else "deferred")
+        print(f"[telegram] {'dropped' if dead else 'deferred'} {msg['method']} to {msg['chat_id']}: {error}")
+
+    # ---- sending ----
+
+    def _call(self, method: str, payload: Dict) -> Dict:
+        try:
+            r = transport.post(f"{self.api}/{method}", json=payload)
+        except Exception as e:
+            raise TelegramError(f"network: {e}")
+        try:
+            body = r.json()
+        except Exception:
+            body = {}
+        if r.status_code == 200 and body.get("ok"):
+            return body.get("result") or {}
+        desc = str(body.get("description") or r.text[:200])
+        if r.status_code == 429:
+            retry_after = float((body.get("parameters") or {}).get("retry_after") or 1)
+            raise TelegramError(f"429 {desc}", retry_after=retry_after)
+        if r.status_code >= 500:
+            raise TelegramError(f"{r.status_code} {desc}")
+        # 400/403/404: the request itself is bad (blocked bot, bad chat, bad markup)
+        raise TelegramError(f"{r.status_code} {desc}", permanent=True)
+
+    # ---- file_id reuse ----
+
+    @staticmethod
+    def _photo_slots(method: str, payload: Dict) -> List[Tuple[Dict, str]]:
+        """(container, field) pairs holding photos, in the order Telegram returns messages."""
+        if method == "sendPhoto":
+            return [(payload, "photo")]
+        if method == "sendMediaGroup":
+            return [(item, "media") for item in payload.get("media") or [] if item.get("type") == "photo"]
+        return []
+
+    def _with_file_ids(self, msg: Dict) -> Tuple[Dict, List[str]]:
+        """Copy of the payload with known photo URLs swapped for file_ids; also the swapped keys."""
+        if self._files is None:
+            return msg["payload"], []
+        payload = copy.deepcopy(msg["payload"])
+        swapped = []
+        for holder, field in self._photo_slots(msg["method"], payload):
+            ref = holder.get(field)
+            if isinstance(ref, str) and ref.startswith("http"):
+                file_id = self._files.get(self.bot_id, url_key(ref))
+                if file_id:
+                    holder[field] = file_id
+                    swapped.append(url_key(ref))
+        return payload, swapped
+
+    def _remember_file_ids(self, msg: Dict, result) -> None:
+        if self._files is None:
+            return
+        messages = result if isinstance(result, list) else [result]
+        for (holder, field), message in zip(self._photo_slots(msg["method"], msg["payload"]), messages):
+            ref = holder.get(field)
+            if isinstance(ref, str) and ref.startswith("http"):
+                try:
+                    self._files.put(self.bot_id, url_key(ref), photo_file_id(message))
+                except Exception:
+                    pass
+
+    def send(self, msg: Dict, bucket: TokenBucket, deadline: float) -> Optional[Dict]:
+        """Send one outbox message with in-run retries; returns the API result or None."""
+        tries = int(env_float("TELEGRAM_MAX_RETRIES", 3))
+        max_wait = env_float("TELEGRAM_MAX_RETRY_AFTER", 60.0)
+        backoff = 1.0
+        use_file_ids = True
+        for attempt in range(tries + 1):
+            cost = float(msg.get("cost") or 1)
+            bucket.acquire(cost)
+            self._global.acquire(cost)
+            payload, swapped = self._with_file_ids(msg) if use_file_ids else (msg["payload"], [])
+            try:
+                result = self._call(msg["method"], payload)
+            except TelegramError as e:
+                if swapped and e.permanent and is_bad_file_id(str(e)):
+                    # stale/foreign file_id: drop it and resend from the URL
+                    self._files.forget(self.bot_id, swapped)
+                    use_file_ids = False
+                    continue
+                if e.permanent or attempt >= tries:
+                    self._failed(msg, str(e), delay=backoff, permanent=e.permanent)
+                    return None
+                wait = e.retry_after if e.retry_after is not None else backoff
+                if wait > max_wait or time.monotonic() + wait > deadline:
+                    self._failed(msg, str(e), delay=wait, permanent=False)
+                    return None
+                self._bump("retried")
+                time.sleep(wait)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            self._done(msg["id"])
+            self._bump("sent")
+            self._remember_file_ids(msg, result)
+            return result
+        return None
+
+    def flush(self, deadline_secs: Optional[float] = None) -> List[Dict]:
+        """
+        Send everything due in the outbox (older runs' leftovers first), chats in
+        parallel. Returns the sent messages with their API `result`, in outbox order.
+        """
+        try:
+            self.prune()
+        except Exception as e:
+            print(f"[telegram] outbox prune failed: {e}")
+        if deadline_secs is None:
+            deadline_secs = env_float("TELEGRAM_FLUSH_DEADLINE_SECS", 180.0)
+        # the lease outlives this flush (deadline plus one last retry wait)
+        lease = deadline_secs + env_float("TELEGRAM_MAX_RETRY_AFTER", 60.0) + 60.0
+        msgs = self.claim(lease)
+        if not msgs:
+            return []
+        deadline = time.monotonic() + deadline_secs
+        by_chat: Dict[str, List[Dict]] = {}
+        for m in msgs:
+            by_chat.setdefault(m["chat_id"], []).append(m)
+
+        def _worker(chat_msgs: List[Dict]) -> List[Dict]:
+            bucket = _chat_bucket(chat_msgs[0]["chat_id"])
+            sent = []
+            for m in chat_msgs:
+                if time.monotonic() > deadline:
+                    break  # stays pending for the next run
+                result = self.send(m, bucket, deadline)
+                if result is not None:
+                    m["result"] = result
+                    sent.append(m)
+            return sent
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(by_chat)) as pool:
+                done = [m for batch in pool.map(_worker, by_chat.values()) for m in batch]
+        finally:
+            # failed sends already went back to pending/dead; this covers deadline skips
+            self._release([m["id"] for m in msgs])
+        return sorted(done, key=lambda m: m["id"])
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
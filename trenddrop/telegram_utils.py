@@ -1,9 +1,10 @@
 import os
-import requests
 from typing import Iterable
 from pathlib import Path
 from trenddrop.utils.env_loader import load_env_once
 from trenddrop.config import BOT_TOKEN, tg_targets
+from trenddrop.utils import transport
+from trenddrop.telegram_file_ids import file_id_cache, bytes_key, url_key, bot_id_from_token, photo_file_id, is_bad_file_id
 
 ENV_PATH = load_env_once()
 
@@ -28,25 +29,37 @@ def send_text(text: str, **kwargs) -> None:
         try:
             payload = {"chat_id": chat_id, "text": text}
             payload.update(kwargs)
-            requests.post(f"{api}/sendMessage", json=payload, timeout=20).raise_for_status()
+            transport.post(f"{api}/sendMessage", json=payload).raise_for_status()
         except Exception as e:
             print(f"[telegram] send_text failed for {chat_id}: {e}")
 
 
+def _post_photo(api: str, data: dict, photo: bytes | str):
+    if isinstance(photo, (bytes, bytearray)):
+        files = {"photo": ("photo.jpg", bytes(photo))}
+        return transport.post(f"{api}/sendPhoto", data=data, files=files)
+    return transport.post(f"{api}/sendPhoto", json=dict(data, photo=str(photo)))
+
+
 def send_photo(photo: bytes | str, caption: str | None = None, **kwargs) -> None:
     api = _api_base()
     targets = _targets()
+    # the first upload/fetch yields a file_id that later targets (and runs) reuse
+    cache = file_id_cache()
+    bot_id = bot_id_from_token(BOT_TOKEN or "")
+    key = bytes_key(bytes(photo)) if isinstance(photo, (bytes, bytearray)) else url_key(str(photo))
     for chat_id in targets:
         try:
             data = {"chat_id": chat_id, "caption": caption or ""}
             data.update(kwargs)
-            # Accept URL or bytes
-            if isinstance(photo, (bytes, bytearray)):
-                files = {"photo": ("photo.jpg", photo)}
-                requests.post(f"{api}/sendPhoto", data=data, files=files, timeout=20).raise_for_status()
-            else:
-                data["photo"] = str(photo)
-                requests.post(f"{api}/sendPhoto", json=data, timeout=20).raise_for_status()
+            file_id = cache.get(bot_id, key) if cache else None
+            r = _post_photo(api, data, file_id or photo)
+            if file_id and r.status_code == 400 and is_bad_file_id(r.text):
+                cache.forget(bot_id, [key])
+                r = _post_photo(api, data, photo)
+            r.raise_for_status()
+            if cache:
+                cache.put(bot_id, key, photo_file_id((r.json() or {}).get("result")))
         except Exception as e:
             print(f"[telegram] send_photo failed for {chat_id}: {e}")
 
@@ -60,22 +73,46 @@ def send_document(document: bytes | str, filename: str | None = None, caption: s
             data.update(kwargs)
             if isinstance(document, (bytes, bytearray)):
                 files = {"document": (filename or "document.bin", document)}
-                requests.post(f"{api}/sendDocument", data=data, files=files, timeout=30).raise_for_status()
+                transport.post(f"{api}/sendDocument", data=data, files=files, timeout=30).raise_for_status()
             else:
                 data["document"] = str(document)
-                requests.post(f"{api}/sendDocument", json=data, timeout=30).raise_for_status()
+                transport.post(f"{api}/sendDocument", json=data, timeout=30).raise_for_status()
         except Exception as e:
             print(f"[telegram] send_document failed for {chat_id}: {e}")
 
 
+def _album_chunks(items: list) -> list[list]:
+    # Telegram accepts 2-10 items per album: split evenly (11 -> 6 + 5) so no album is left with one
+    if not items:
+        return []
+    n = -(-len(items) // 10)
+    size, extra = divmod(len(items), n)
+    chunks, start = [], 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
 def send_media_group(media: Iterable[dict]) -> None:
     api = _api_base()
     targets = _targets()
+    items = list(media)
     for chat_id in targets:
-        try:
-            payload = {"chat_id": chat_id, "media": list(media)}
-            requests.post(f"{api}/sendMediaGroup", json=payload, timeout=30).raise_for_status()
-        except Exception as e:
-            print(f"[telegram] send_media_group failed for {chat_id}: {e}")
+        for chunk in _album_chunks(items):
+            try:
+                if len(chunk) == 1:
+                    # a lone item is not a valid album; send it as sendPhoto/sendVideo/... instead
+                    item = chunk[0]
+                    kind = str(item.get("type") or "photo")
+                    payload = {"chat_id": chat_id, kind: item.get("media")}
+                    payload.update({k: v for k, v in item.items() if k in ("caption", "parse_mode")})
+                    transport.post(f"{api}/send{kind.capitalize()}", json=payload, timeout=30).raise_for_status()
+                    continue
+                payload = {"chat_id": chat_id, "media": chunk}
+                transport.post(f"{api}/sendMediaGroup", json=payload, timeout=30).raise_for_status()
+            except Exception as e:
+                print(f"[telegram] send_media_group failed for {chat_id}: {e}")
 
 
@@ -38,3 +38,30 @@ def load_env_once() -> Path:
     raise FileNotFoundError("Root .env not found. Place a .env at the repo root.")
 
 
+
+def env_float(name: str, default: float) -> float:
+    """Numeric env var; unset, empty or unparsable values give `default`."""
+    try:
+        raw = os.environ.get(name)
+        return float(raw) if raw not in (None, "") else default
+    except Exception:
+        return default
+
+
+def env_int(name: str, default: int) -> int:
+    """Integer env var; unset, empty or unparsable values give `default`."""
+    try:
+        raw = os.environ.get(name)
+        return int(raw) if raw not in (None, "") else default
+    except Exception:
+        return default
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """On/off env var: 1/true/yes/on or 0/false/no/off; unset, empty or anything else gives `default`."""
+    raw = str(os.environ.get(name) or "").strip().lower()
+    if raw in ("1", "true", "yes", "on"):
+        return True
+    if raw in ("0", "false", "no", "off"):
+        return False
+    return default
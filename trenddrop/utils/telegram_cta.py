@@ -2,10 +2,10 @@
 import os
 import time
 import json
-import requests
 from pathlib import Path
 from pathlib import Path as _Path
 from trenddrop.utils.env_loader import load_env_once
+from trenddrop.utils import transport
 
 # Ensure root .env is loaded even when running from subfolders
 ENV_PATH = load_env_once()
@@ -26,7 +26,7 @@ def _tg_send(text: str, disable_preview: bool = False):
         raise RuntimeError("Missing TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID")
     url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     payload = {"chat_id": CHAT_ID, "text": text, "disable_web_page_preview": disable_preview}
-    r = requests.post(url, json=payload, timeout=20)
+    r = transport.post(url, json=payload)
     r.raise_for_status()
     return r.json()
 
@@ -0,0 +1,94 @@
+"""Shared, connection-pooled HTTP transport.
+
+Every outbound call (eBay, Telegram, Supabase functions, storefront APIs,
+image downloads) goes through one ``requests.Session`` so TCP+TLS
+connections are kept alive and reused per host instead of re-opened on
+every call. Timeouts and retries are uniform and tunable via env:
+
+- HTTP_CONNECT_TIMEOUT_SECS (default 5), HTTP_READ_TIMEOUT_SECS (default 20)
+- HTTP_POOL_HOSTS: number of per-host pools kept (default 16)
+- HTTP_POOL_MAXSIZE: keep-alive connections per host (default 16)
+- HTTP_RETRIES: retries for connection errors and idempotent 5xx (default 2)
+
+Deliberately does not load .env so it stays usable from the storefront
+scripts, which run without one.
+"""
+from __future__ import annotations
+import threading
+from typing import Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from trenddrop.utils.env_loader import env_float
+
+USER_AGENT = "TrendDropBot/1.0"
+
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+
+
+def default_timeout() -> Tuple[float, float]:
+    return (env_float("HTTP_CONNECT_TIMEOUT_SECS", 5.0), env_float("HTTP_READ_TIMEOUT_SECS", 20.0))
+
+
+def _retry() -> Retry:
+    n = max(0, int(env_float("HTTP_RETRIES", 2)))
+    # connect errors are retried for every method (nothing was sent yet);
+    # read/status retries stay limited to idempotent methods so POSTs are never duplicated
+    return Retry(
+        total=n,
+        connect=n,
+        read=n,
+        status=n,
+        backoff_factor=0.5,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def _build_session() -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=max(1, int(env_float("HTTP_POOL_HOSTS", 16))),
+        pool_maxsize=max(1, int(env_float("HTTP_POOL_MAXSIZE", 16))),
+        max_retries=_retry(),
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({"User-Agent": USER_AGENT})
+    return s
+
+
+def session() -> requests.Session:
+    """Process-wide pooled session (created lazily, safe to share across threads)."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def request(method: str, url: str, timeout: Union[None, float, Tuple[float, float]] = None, **kwargs) -> requests.Response:
+    return session().request(method, url, timeout=timeout or default_timeout(), **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def retries_used(resp: requests.Response) -> int:
+    """Number of automatic retries urllib3 made before returning `resp`."""
+    try:
+        history = getattr(getattr(resp.raw, "retries", None), "history", None)
+        return len(history or ())
+    except Exception:
+        return 0
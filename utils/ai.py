@@ -1,47 +1,36 @@
-import os, json, re
+import os, json, re, time
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
-from trenddrop.utils.env_loader import load_env_once
+from trenddrop.utils.env_loader import load_env_once, env_float, env_int
 
 # Ensure root .env is loaded
 ENV_PATH = load_env_once()
-from typing import Dict
+from typing import Dict, List, Optional, Sequence, Tuple
 
 try:
     import openai  # type: ignore
 except Exception:
     openai = None  # type: ignore
 
+from utils.ai_cache import copy_cache, make_key
+from utils.classify import classify, emojis_for, product_text
+
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
-PROMPT = """You write short hypey product captions (<180 chars) with an emoji and a CTA.
-Return just the sentence, no extra quotes.
-Title: {title}
-Price: {currency} {price}
-"""
+MODEL = "gpt-4o-mini"
+# bump when _COPY_SYS_PROMPT/_COPY_RULES change so cached copy is regenerated
+COPY_PROMPT_VERSION = "copy-v1"
 
 
-def caption_for(p: Dict) -> str:
-    if not OPENAI_API_KEY or not openai:
-        title = str(p.get("title", ""))[:120]
-        currency = p.get("currency", "USD")
-        price = p.get("price", "")
-        return f"{title} • {currency} {price}"
-    try:
-        if hasattr(openai, "api_key"):
-            openai.api_key = OPENAI_API_KEY
-        text = PROMPT.format(title=p.get("title", ""), currency=p.get("currency", "USD"), price=p.get("price", ""))
-        resp = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": text}],
-            temperature=0.7,
-            max_tokens=80,
-        )
-        return resp.choices[0].message.content.strip()
-    except Exception:
-        title = str(p.get("title", ""))[:120]
-        currency = p.get("currency", "USD")
-        price = p.get("price", "")
-        return f"{title} • {currency} {price}"
+def _fallback_caption(p: Dict) -> str:
+    title = str(p.get("title", ""))[:120]
+    currency = p.get("currency", "USD")
+    price = p.get("price", "")
+    return f"{title} • {currency} {price}"
+
+
+_NOISE_RE = re.compile(r"\b(New|Brand\s*New|Hot|Sale|4IN1|3IN1|2PCS|Lot|Bundle)\b", re.I)
+_MULTISPACE_RE = re.compile(r"\s{2,}")
 
 
 def _fallback_marketing_copy(p: Dict) -> Dict:
@@ -54,21 +43,13 @@ def _fallback_marketing_copy(p: Dict) -> Dict:
     # Headline: trim and add a leading emoji when obvious
     headline = raw_title
     # Simplify noisy eBay titles
-    headline = re.sub(r"\b(New|Brand\s*New|Hot|Sale|4IN1|3IN1|2PCS|Lot|Bundle)\b", "", headline, flags=re.I)
-    headline = re.sub(r"\s{2,}", " ", headline).strip()
+    headline = _NOISE_RE.sub("", headline)
+    headline = _MULTISPACE_RE.sub(" ", headline).strip()
     headline = headline[:90]
 
-    # Emoji pack guess
-    text = f"{raw_title} {p.get('keyword','')}".lower()
-    emojis = ""
-    if any(k in text for k in ["game", "gaming", "xbox", "ps5", "keyboard", "mouse"]):
-        emojis = "🕹️🎮✨"
-    elif any(k in text for k in ["dress", "jacket", "sneaker", "fashion", "shirt", "jean"]):
-        emojis = "👗👟✨"
-    elif any(k in text for k in ["sofa", "lamp", "home", "kitchen", "cook", "vacuum"]):
-        emojis = "🏠🛋️✨"
-    else:
-        emojis = "🔥✨"
+    # Emoji pack from the keyword taxonomy (utils.classify)
+    category = p.get("category") or classify(product_text(p))
+    emojis = emojis_for(category)
 
     # Blurb: add urgency
     blurb_bits = ["Limited stock—grab it now!"]
@@ -84,66 +65,257 @@ def _fallback_marketing_copy(p: Dict) -> Dict:
     return {"headline": headline, "blurb": blurb, "emojis": emojis}
 
 
-def marketing_copy_for(p: Dict) -> Dict:
-    """
-    Generate short, punchy marketing copy for a product:
-      - headline: concise hook (<= 80-90 chars)
-      - blurb: 1–2 sentences with urgency and CTA
-      - emojis: optional emoji pack (e.g., gaming 🕹️, home 🏠, fashion 👗)
+_COPY_SYS_PROMPT = (
+    "You are a conversion-focused copywriter for an affiliate deals site. "
+    "Write exciting but truthful copy. Always answer with a single JSON object."
+)
 
-    Returns a dict with keys: headline, blurb, emojis
-    """
-    if not OPENAI_API_KEY or not openai:
-        return _fallback_marketing_copy(p)
+_COPY_RULES = (
+    "Rules:\n"
+    "- caption: one hypey sentence (< 180 chars) with an emoji and a CTA.\n"
+    "- headline: short, punchy, <= 90 chars; can include a leading emoji.\n"
+    "- blurb: 1–2 sentences, urgency (limited time/stock), clear benefit + CTA.\n"
+    "- emojis: optional 2–3 emojis relevant to category; prefer from {gaming: 🕹️🎮, home: 🏠🛋️, fashion: 👗👟}.\n"
+    "- Keep it clean, no quotes or markdown.\n"
+)
 
-    raw_title = str(p.get("title", ""))
-    currency = p.get("currency", "USD")
-    price = p.get("price", "")
-    topic = ", ".join(p.get("tags", []) or ([p.get("keyword")] if p.get("keyword") else []))
 
-    sys_prompt = (
-        "You are a conversion-focused copywriter for an affiliate deals site. "
-        "Write exciting but truthful copy."
-    )
+def _topic(p: Dict) -> str:
+    return ", ".join(p.get("tags", []) or ([p.get("keyword")] if p.get("keyword") else []))
+
+
+def _parse_json_object(content: str) -> Dict:
+    content = (content or "").strip()
+    # Extract JSON (model may include stray text)
+    match = re.search(r"\{[\s\S]*\}$", content)
+    data = json.loads(match.group(0) if match else content)
+    if not isinstance(data, dict):
+        raise ValueError("ai response is not an object")
+    return data
+
+
+def _validated_copy(data: Dict, p: Dict) -> Dict:
+    """headline and blurb are required; a missing caption falls back on its own."""
+    headline = str(data.get("headline", "") or "").strip() or None
+    blurb = str(data.get("blurb", "") or "").strip() or None
+    emojis = str(data.get("emojis", "") or "").strip()
+    if not (headline and blurb):
+        raise ValueError("incomplete ai response")
+    caption = str(data.get("caption", "") or "").strip() or _fallback_caption(p)
+    return {"caption": caption[:180], "headline": headline[:90], "blurb": blurb[:240], "emojis": emojis[:16]}
+
+
+def _copy_cache_key(p: Dict) -> str:
+    price = p.get("price")
+    price = f"{price:.2f}" if isinstance(price, (int, float)) else str(price or "")
+    return make_key(str(p.get("title", "")).strip(), price, p.get("currency", "USD"), _topic(p),
+                    MODEL, COPY_PROMPT_VERSION)
+
+
+def _fallback_copy(p: Dict) -> Dict:
+    copy = _fallback_marketing_copy(p)
+    copy["caption"] = _fallback_caption(p)
+    return copy
+
+
+# Batch sizing: rough 4-chars-per-token estimate for the prompt, and a fixed
+# output allowance per product (4 short fields of JSON).
+_OUTPUT_TOKENS_PER_ITEM = 120
+_BATCH_OVERHEAD_TOKENS = 300
+
+
+def _request_timeout() -> float:
+    # seconds per OpenAI request (the client retries on top of this)
+    return env_float("AI_REQUEST_TIMEOUT_SECS", 20.0)
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _product_line(pid: str, p: Dict) -> str:
+    title = str(p.get("title", "")).replace("\n", " ")[:200]
+    return f"- id: {pid} | title: {title} | price: {p.get('currency', 'USD')} {p.get('price', '')} | topic: {_topic(p)}\n"
 
+
+def _plan_batches(products: Sequence[Dict]) -> List[List[int]]:
+    """Split product indexes into batches that fit AI_BATCH_MAX_ITEMS and the token budgets."""
+    max_items = max(1, env_int("AI_BATCH_MAX_ITEMS", 25))
+    max_in = env_int("AI_BATCH_MAX_INPUT_TOKENS", 6000)
+    max_out = env_int("AI_BATCH_MAX_OUTPUT_TOKENS", 4000)
+    batches: List[List[int]] = []
+    cur: List[int] = []
+    cur_in = _BATCH_OVERHEAD_TOKENS
+    for i, p in enumerate(products):
+        cost = _estimate_tokens(_product_line(str(len(cur) + 1), p))
+        if cur and (len(cur) >= max_items
+                    or cur_in + cost > max_in
+                    or (len(cur) + 1) * _OUTPUT_TOKENS_PER_ITEM > max_out):
+            batches.append(cur)
+            cur, cur_in = [], _BATCH_OVERHEAD_TOKENS
+        cur.append(i)
+        cur_in += cost
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+def _request_batch(chunk: Sequence[Dict]) -> Tuple[Dict[str, Dict], Optional[str]]:
+    """One chat completion for `chunk`; returns ({id: raw entry}, finish_reason)."""
+    lines = "".join(_product_line(str(n), p) for n, p in enumerate(chunk, 1))
     user_prompt = (
-        "Create concise marketing copy with this structure and return ONLY compact JSON.\n"
-        "Rules:\n"
-        "- headline: short, punchy, <= 90 chars; can include a leading emoji.\n"
-        "- blurb: 1–2 sentences, urgency (limited time/stock), clear benefit + CTA.\n"
-        "- emojis: optional 2–3 emojis relevant to category; prefer from {gaming: 🕹️🎮, home: 🏠🛋️, fashion: 👗👟}.\n"
-        "- Keep it clean, no quotes or markdown.\n"
-        "Product:\n"
-        f"- title: {raw_title}\n"
-        f"- price: {currency} {price}\n"
-        f"- topic: {topic}\n\n"
-        "Respond as JSON with keys exactly: headline, blurb, emojis."
+        "Create concise marketing copy for each product below.\n"
+        + _COPY_RULES
+        + "Products:\n"
+        + lines
+        + "\nRespond as JSON: {\"items\": [{\"id\", \"caption\", \"headline\", \"blurb\", \"emojis\"}]}, "
+        "one entry per product id."
     )
+    if hasattr(openai, "api_key"):
+        openai.api_key = OPENAI_API_KEY
+    resp = openai.chat.completions.create(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": _COPY_SYS_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.8,
+        max_tokens=_BATCH_OVERHEAD_TOKENS + _OUTPUT_TOKENS_PER_ITEM * len(chunk),
+        timeout=_request_timeout(),
+    )
+    choice = resp.choices[0]
+    finish = getattr(choice, "finish_reason", None)
+    try:
+        entries = _parse_json_object(choice.message.content).get("items")
+    except Exception:
+        if finish == "length":
+            return {}, finish
+        raise
+    out: Dict[str, Dict] = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if isinstance(entry, dict) and entry.get("id") is not None:
+            out[str(entry["id"]).strip()] = entry
+    return out, finish
+
 
+def _copy_chunk(products: Sequence[Dict], idx: List[int], out: Dict[int, Optional[Dict]]) -> None:
+    chunk = [products[i] for i in idx]
     try:
-        if hasattr(openai, "api_key"):
-            openai.api_key = OPENAI_API_KEY
-        resp = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.8,
-            max_tokens=200,
-        )
-        content = resp.choices[0].message.content.strip()
-        # Extract JSON (model may include stray text)
-        match = re.search(r"\{[\s\S]*\}$", content)
-        json_text = match.group(0) if match else content
-        data = json.loads(json_text)
-        headline = str(data.get("headline", "")).strip() or None
-        blurb = str(data.get("blurb", "")).strip() or None
-        emojis = str(data.get("emojis", "")).strip()
-        if not (headline and blurb):
-            raise ValueError("incomplete ai response")
-        return {"headline": headline[:90], "blurb": blurb[:240], "emojis": emojis[:16]}
+        entries, finish = _request_batch(chunk)
     except Exception:
-        return _fallback_marketing_copy(p)
+        entries, finish = {}, None
+    if finish == "length" and len(idx) > 1:
+        # output was cut off: keep what parsed, retry the rest in halves
+        rest = []
+        for n, i in enumerate(idx, 1):
+            try:
+                out[i] = _validated_copy(entries[str(n)], products[i])
+            except Exception:
+                rest.append(i)
+        if rest:
+            mid = (len(rest) + 1) // 2
+            _copy_chunk(products, rest[:mid], out)
+            _copy_chunk(products, rest[mid:], out)
+        return
+    for n, i in enumerate(idx, 1):
+        try:
+            out[i] = _validated_copy(entries[str(n)], products[i])
+        except Exception:
+            out[i] = None  # copy_for_batch falls back
+
+
+def _run_batch(products: Sequence[Dict], idx: List[int]) -> Dict[int, Optional[Dict]]:
+    out: Dict[int, Optional[Dict]] = {}
+    _copy_chunk(products, idx, out)
+    return out
+
+
+def copy_for_batch(products: Sequence[Dict], concurrency: int = 1,
+                   deadline_secs: Optional[float] = None) -> List[Dict]:
+    """
+    Caption + marketing copy for many products with a handful of requests:
+    products are sent in token-budgeted batches and matched back by id. Missing
+    or invalid entries fall back per product. Products with cached copy are not
+    sent at all.
+
+    Up to `concurrency` batches run at once. With `deadline_secs`, whatever has
+    not come back by then gets fallback copy and the call returns; late batches
+    still land in the cache for the next run.
+    Returns one dict per product, in order.
+    """
+    if not products:
+        return []
+    cache = copy_cache()
+    keys = [_copy_cache_key(p) for p in products]
+    cached = cache.get_many(keys) if cache else {}
+    out: List[Optional[Dict]] = [dict(cached[k]) if k in cached else None for k in keys]
+    todo = [i for i, c in enumerate(out) if c is None]
+    if todo and OPENAI_API_KEY and openai:
+        pending = [products[i] for i in todo]
+        pending_keys = [keys[i] for i in todo]
+
+        def _store(generated: Dict[int, Optional[Dict]]) -> None:
+            fresh = {pending_keys[j]: c for j, c in generated.items() if c is not None}
+            if cache and fresh:
+                try:
+                    cache.put_many(fresh)
+                except Exception:
+                    pass
+
+        def _on_done(fut) -> None:
+            if not fut.cancelled() and fut.exception() is None:
+                _store(fut.result())
+
+        started = time.monotonic()
+        pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        futures = [pool.submit(_run_batch, pending, idx) for idx in _plan_batches(pending)]
+        for fut in futures:
+            fut.add_done_callback(_on_done)
+        done, not_done = wait(futures, timeout=deadline_secs)
+        # queued batches are dropped; in-flight ones finish in the background
+        for fut in not_done:
+            fut.cancel()
+        pool.shutdown(wait=False)
+        for fut in done:
+            if fut.exception() is None:
+                for j, copy in fut.result().items():
+                    if copy is not None:
+                        out[todo[j]] = copy
+        if not_done:
+            late = sum(1 for c in out if c is None)
+            print(f"[ai] copy deadline hit after {time.monotonic() - started:.1f}s; {late} products use fallback copy")
+    return [c if c is not None else _fallback_copy(p) for c, p in zip(out, products)]
+
+
+def copy_for(p: Dict) -> Dict:
+    """
+    Caption and marketing copy for one product (cached, with fallback).
+
+    Returns a dict with keys: caption, headline, blurb, emojis
+    """
+    return copy_for_batch([p])[0]
+
+
+def caption_for(p: Dict) -> str:
+    return copy_for(p)["caption"]
+
+
+def marketing_copy_for(p: Dict) -> Dict:
+    """
+    Generate short, punchy marketing copy for a product:
+      - headline: concise hook (<= 80-90 chars)
+      - blurb: 1–2 sentences with urgency and CTA
+      - emojis: optional emoji pack (e.g., gaming 🕹️, home 🏠, fashion 👗)
+
+    Returns a dict with keys: headline, blurb, emojis
+    """
+    copy = copy_for(p)
+    return {k: copy[k] for k in ("headline", "blurb", "emojis")}
 
 
+def enrich_copy(products: Sequence[Dict]) -> List[Dict]:
+    """copy_for_batch with AI_CONCURRENCY (4) parallel batches and an AI_DEADLINE_SECS (45) stage deadline."""
+    deadline = env_float("AI_DEADLINE_SECS", 45.0)
+    return copy_for_batch(products, concurrency=max(1, env_int("AI_CONCURRENCY", 4)),
+                          deadline_secs=deadline if deadline > 0 else None)
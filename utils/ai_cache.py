@@ -0,0 +1,126 @@
+import os, json, time, hashlib, sqlite3, threading
+from typing import Dict, Iterable, Optional
+
+from trenddrop.utils.env_loader import env_int, env_flag
+
+# Local cache for AI-generated product copy, content-addressed by a hash of
+# everything that shapes the output (see utils.ai._copy_cache_key). Entries
+# carry a last_used stamp; past AI_CACHE_MAX_ENTRIES the least recently used
+# rows are evicted.
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+_DEFAULT_PATH = os.path.join(_ROOT_DIR, ".cache", "ai", "copy.sqlite")
+
+_STATS = {"hit": 0, "miss": 0, "write": 0, "evicted": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _bump(name: str, n: int = 1) -> None:
+    with _STATS_LOCK:
+        _STATS[name] += n
+
+
+def cache_stats() -> Dict:
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+    looked_up = stats["hit"] + stats["miss"]
+    stats["hit_rate"] = round(stats["hit"] / looked_up, 3) if looked_up else 0.0
+    return stats
+
+
+def cache_enabled() -> bool:
+    return env_flag("AI_CACHE", True)
+
+
+def _max_entries() -> int:
+    return max(1, env_int("AI_CACHE_MAX_ENTRIES", 20000))
+
+
+def make_key(*parts) -> str:
+    basis = "\x1f".join("" if p is None else str(p) for p in parts)
+    return hashlib.sha256(basis.encode("utf-8")).hexdigest()
+
+
+class CopyCache:
+    def __init__(self, path: str = _DEFAULT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS copy ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created INTEGER NOT NULL, last_used INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS copy_last_used ON copy (last_used)")
+        self._db.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Dict] = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for key, value in self._db.execute(f"SELECT key, value FROM copy WHERE key IN ({marks})", chunk):
+                    try:
+                        found[key] = json.loads(value)
+                    except Exception:
+                        continue
+            if found:
+                now = int(time.time())
+                self._db.executemany("UPDATE copy SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._db.commit()
+        _bump("hit", len(found))
+        _bump("miss", len(keys) - len(found))
+        return found
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, entries: Dict[str, Dict]) -> None:
+        if not entries:
+            return
+        now = int(time.time())
+        rows = [(k, json.dumps(v, ensure_ascii=False), now, now) for k, v in entries.items()]
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO copy (key, value, created, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, last_used = excluded.last_used",
+                rows,
+            )
+            excess = self._db.execute("SELECT COUNT(*) FROM copy").fetchone()[0] - _max_entries()
+            if excess > 0:
+                evicted = self._db.execute(
+                    "DELETE FROM copy WHERE key IN (SELECT key FROM copy ORDER BY last_used LIMIT ?)", (excess,)
+                ).rowcount
+                _bump("evicted", evicted)
+            self._db.commit()
+        _bump("write", len(rows))
+
+    def put(self, key: str, value: Dict) -> None:
+        self.put_many({key: value})
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_CACHE: Optional[CopyCache] = None
+_CACHE_INIT_LOCK = threading.Lock()
+
+
+def copy_cache() -> Optional[CopyCache]:
+    """Process-wide cache, or None when disabled/unusable."""
+    global _CACHE
+    if not cache_enabled():
+        return None
+    with _CACHE_INIT_LOCK:
+        if _CACHE is None:
+            try:
+                _CACHE = CopyCache()
+            except Exception as e:
+                print(f"[ai] copy cache unavailable: {e}")
+                return None
+        return _CACHE
@@ -0,0 +1,169 @@
+import os, json, threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Rule-based product categories without an LLM call. All keywords of the
+# taxonomy are compiled into one Aho-Corasick automaton, so a title is scanned
+# once regardless of how many keywords/categories there are.
+#
+# Categories are listed in priority order: when a title matches several, the
+# earliest wins. Keywords match as substrings (like the old `k in text` checks)
+# unless the category sets "whole_word".
+
+DEFAULT_CATEGORY = "general"
+DEFAULT_EMOJIS = "🔥✨"
+
+DEFAULT_TAXONOMY: List[Dict] = [
+    {"name": "gaming", "emojis": "🕹️🎮✨",
+     "keywords": ["game", "gaming", "xbox", "ps5", "keyboard", "mouse"]},
+    {"name": "fashion", "emojis": "👗👟✨",
+     "keywords": ["dress", "jacket", "sneaker", "fashion", "shirt", "jean"]},
+    {"name": "home", "emojis": "🏠🛋️✨",
+     "keywords": ["sofa", "lamp", "home", "kitchen", "cook", "vacuum"]},
+    {"name": "tech", "emojis": "🎧📱✨", "whole_word": True,
+     "keywords": ["headphones", "earbuds", "charger", "bluetooth", "laptop", "iphone", "ipad",
+                  "tablet", "camera", "speaker", "smartwatch", "airpods", "usb"]},
+    {"name": "beauty", "emojis": "💄✨", "whole_word": True,
+     "keywords": ["makeup", "lipstick", "skincare", "serum", "perfume", "moisturizer", "mascara"]},
+    {"name": "fitness", "emojis": "🏋️💪✨", "whole_word": True,
+     "keywords": ["yoga", "dumbbell", "dumbbells", "fitness", "treadmill", "kettlebell", "resistance band"]},
+    {"name": "toys", "emojis": "🧸🎁✨", "whole_word": True,
+     "keywords": ["lego", "toy", "toys", "plush", "puzzle", "action figure"]},
+]
+
+
+def load_taxonomy() -> List[Dict]:
+    """DEFAULT_TAXONOMY, or the JSON list at CATEGORY_TAXONOMY_PATH (same shape)."""
+    path = os.environ.get("CATEGORY_TAXONOMY_PATH")
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, list) and data:
+                return data
+        except Exception as e:
+            print(f"[classify] taxonomy {path} unusable, using defaults: {e}")
+    return DEFAULT_TAXONOMY
+
+
+class KeywordClassifier:
+    """Aho-Corasick automaton over every taxonomy keyword."""
+
+    def __init__(self, taxonomy: Sequence[Dict]):
+        self.names = [str(c.get("name") or DEFAULT_CATEGORY) for c in taxonomy]
+        self.emojis = {str(c.get("name")): str(c.get("emojis") or DEFAULT_EMOJIS) for c in taxonomy}
+        self._goto: List[Dict[str, int]] = [{}]
+        # per state: (category index, keyword length, whole_word) for keywords ending here
+        self._out: List[List[Tuple[int, int, bool]]] = [[]]
+        for ci, cat in enumerate(taxonomy):
+            whole = bool(cat.get("whole_word"))
+            for kw in cat.get("keywords") or []:
+                kw = str(kw).lower()
+                if kw:
+                    self._insert(kw, (ci, len(kw), whole))
+        self._link()
+
+    def _insert(self, kw: str, out: Tuple[int, int, bool]) -> None:
+        state = 0
+        for ch in kw:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._out.append([])
+            state = nxt
+        self._out[state].append(out)
+
+    def _link(self) -> None:
+        fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                f = fail[state]
+                while f and ch not in self._goto[f]:
+                    f = fail[f]
+                fail[nxt] = self._goto[f].get(ch, 0)
+                # inherit outputs of the longest proper suffix
+                self._out[nxt] = self._out[nxt] + self._out[fail[nxt]]
+                queue.append(nxt)
+        self._fail = fail
+        # matches sorted by priority so the first acceptable one is the answer for that state
+        self._out = [sorted(o) for o in self._out]
+
+    def classify_index(self, text: str) -> Optional[int]:
+        """Highest-priority category index matched in `text`, or None."""
+        text = (text or "").lower()
+        goto, fail, outs = self._goto, self._fail, self._out
+        best: Optional[int] = None
+        state = 0
+        n = len(text)
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for ci, length, whole in outs[state]:
+                if best is not None and ci >= best:
+                    break
+                if whole:
+                    start = pos - length + 1
+                    if (start > 0 and text[start - 1].isalnum()) or (pos + 1 < n and text[pos + 1].isalnum()):
+                        continue
+                best = ci
+                break
+            if best == 0:
+                break
+        return best
+
+    def classify(self, text: str) -> str:
+        ci = self.classify_index(text)
+        return self.names[ci] if ci is not None else DEFAULT_CATEGORY
+
+    def classify_many(self, texts: Sequence[str]) -> List[str]:
+        names = self.names
+        memo: Dict[str, str] = {}  # listing titles repeat a lot across topics/resellers
+        out = []
+        for t in texts:
+            name = memo.get(t)
+            if name is None:
+                ci = self.classify_index(t)
+                name = memo[t] = names[ci] if ci is not None else DEFAULT_CATEGORY
+            out.append(name)
+        return out
+
+    def emojis_for(self, category: str) -> str:
+        return self.emojis.get(category, DEFAULT_EMOJIS)
+
+
+_CLASSIFIER: Optional[KeywordClassifier] = None
+_CLASSIFIER_LOCK = threading.Lock()
+
+
+def classifier() -> KeywordClassifier:
+    global _CLASSIFIER
+    with _CLASSIFIER_LOCK:
+        if _CLASSIFIER is None:
+            _CLASSIFIER = KeywordClassifier(load_taxonomy())
+        return _CLASSIFIER
+
+
+def product_text(p: Dict) -> str:
+    return f"{p.get('title', '')} {p.get('keyword', '')}"
+
+
+def classify(text: str) -> str:
+    return classifier().classify(text)
+
+
+def classify_many(texts: Sequence[str]) -> List[str]:
+    return classifier().classify_many(texts)
+
+
+def classify_products(products: Sequence[Dict]) -> None:
+    """Set p["category"] on every product that does not have one yet."""
+    todo = [p for p in products if not p.get("category")]
+    for p, cat in zip(todo, classify_many([product_text(p) for p in todo])):
+        p["category"] = cat
+
+
+def emojis_for(category: str) -> str:
+    return classifier().emojis_for(category)
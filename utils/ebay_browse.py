@@ -1,29 +1,35 @@
-import os, time, base64, json, requests
+import os, time, random, base64, json, hashlib, threading
 from pathlib import Path
-from trenddrop.utils.env_loader import load_env_once
+from trenddrop.utils.env_loader import load_env_once, env_flag
 
 # Ensure root .env is loaded
 ENV_PATH = load_env_once()
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
+from utils.ebay_budget import try_spend, record_spent
+from utils.ratelimit import TokenBucket
+from trenddrop.utils import transport
+from utils.filelock import file_lock, read_json, atomic_write_json
 
 _OAUTH_CACHE: Dict[str, Dict] = {}
+_OAUTH_LOCK = threading.Lock()
+_OAUTH_SCOPE = "https://api.ebay.com/oauth/api_scope"
+_ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+_CACHE_DIR = os.path.join(_ROOT_DIR, ".cache", "ebay")
 
-def _get_oauth_token() -> str:
-    """
-    Client Credentials flow for eBay Buy APIs (Production).
-    Caches token in-process until expiry.
-    """
-    global _OAUTH_CACHE
-    now = time.time()
-    cached = _OAUTH_CACHE.get("token")
-    if cached and cached["exp"] - 60 > now:
-        return cached["access_token"]
+def _token_file_enabled() -> bool:
+    return env_flag("EBAY_OAUTH_FILE_CACHE", True)
+
+def _token_path() -> str:
+    return os.path.join(_CACHE_DIR, "oauth_token.json")
 
-    cid = os.environ.get("EBAY_CLIENT_ID")
-    csec = os.environ.get("EBAY_CLIENT_SECRET")
-    if not cid or not csec:
-        raise RuntimeError("EBAY_CLIENT_ID / EBAY_CLIENT_SECRET not set")
+def _token_slot(cid: str) -> str:
+    # never persist the client id itself; tokens are keyed by a digest of it
+    return hashlib.sha256(f"{cid}|{_OAUTH_SCOPE}".encode("utf-8")).hexdigest()[:24]
 
+def _token_fresh(entry, now: float) -> bool:
+    return isinstance(entry, dict) and bool(entry.get("access_token")) and float(entry.get("exp") or 0) - 60 > now
+
+def _request_oauth_token(cid: str, csec: str) -> Dict:
     token_url = "https://api.ebay.com/identity/v1/oauth2/token"
     auth = base64.b64encode(f"{cid}:{csec}".encode()).decode()
     headers = {
@@ -33,81 +39,188 @@ def _get_oauth_token() -> str:
     # minimal scope works for Browse search
     data = {
         "grant_type": "client_credentials",
-        "scope": "https://api.ebay.com/oauth/api_scope"
+        "scope": _OAUTH_SCOPE
     }
-    r = requests.post(token_url, headers=headers, data=data, timeout=25)
+    if not try_spend("oauth"):
+        raise RuntimeError("eBay daily call budget exhausted (oauth)")
+    now = time.time()
+    r = transport.post(token_url, headers=headers, data=data)
     if r.status_code != 200:
         raise RuntimeError(f"OAuth failed {r.status_code}: {r.text[:300]}")
     tok = r.json()
-    _OAUTH_CACHE["token"] = {
+    return {
         "access_token": tok["access_token"],
         "exp": now + int(tok.get("expires_in", 7200))
     }
-    return tok["access_token"]
 
-def search_browse(keyword: str, limit: int = 12) -> List[Dict]:
+def _get_oauth_token() -> str:
     """
-    Use Buy Browse API: /buy/browse/v1/item_summary/search
+    Client Credentials flow for eBay Buy APIs (Production).
+    Caches the token in-process and in .cache/ebay/oauth_token.json so other
+    processes reuse it until expiry. Refreshes are single-flight: one thread
+    per process, and one process per cache directory, hits the token endpoint.
     """
+    cached = _OAUTH_CACHE.get("token")
+    if _token_fresh(cached, time.time()):
+        return cached["access_token"]
+
+    with _OAUTH_LOCK:
+        # another thread may have refreshed while we waited
+        cached = _OAUTH_CACHE.get("token")
+        if _token_fresh(cached, time.time()):
+            return cached["access_token"]
+
+        cid = os.environ.get("EBAY_CLIENT_ID")
+        csec = os.environ.get("EBAY_CLIENT_SECRET")
+        if not cid or not csec:
+            raise RuntimeError("EBAY_CLIENT_ID / EBAY_CLIENT_SECRET not set")
+
+        if not _token_file_enabled():
+            _OAUTH_CACHE["token"] = _request_oauth_token(cid, csec)
+            return _OAUTH_CACHE["token"]["access_token"]
+
+        slot = _token_slot(cid)
+        path = _token_path()
+        with file_lock(path + ".lock"):
+            stored = read_json(path, {}) or {}
+            entry = stored.get(slot) if isinstance(stored, dict) else None
+            if _token_fresh(entry, time.time()):
+                _OAUTH_CACHE["token"] = entry
+                return entry["access_token"]
+            entry = _request_oauth_token(cid, csec)
+            _OAUTH_CACHE["token"] = entry
+            stored = stored if isinstance(stored, dict) else {}
+            stored[slot] = entry
+            if atomic_write_json(path, stored):
+                try:
+                    os.chmod(path, 0o600)
+                except Exception:
+                    pass
+            return entry["access_token"]
+
+_BROWSE_URL = "https://api.ebay.com/buy/browse/v1/item_summary/search"
+_BROWSE_MAX_PAGE = 200  # Browse caps `limit` at 200 per request
+MARKETPLACE_CURRENCY = {"EBAY_US": "USD", "EBAY_GB": "GBP", "EBAY_DE": "EUR"}
+DEFAULT_MARKETPLACE = "EBAY_US"
+
+def _parse_item(it: Dict, keyword: str, marketplace: str = DEFAULT_MARKETPLACE) -> Optional[Dict]:
+    try:
+        title = it.get("title", "")
+        price_obj = (it.get("price") or {})
+        price = float(price_obj.get("value", 0.0))
+        currency = price_obj.get("currency", MARKETPLACE_CURRENCY.get(marketplace, "USD"))
+        image_url = (it.get("image") or {}).get("imageUrl", "")
+        url2 = it.get("itemWebUrl") or it.get("itemAffiliateWebUrl") or ""
+        seller = (it.get("seller") or {})
+        feedback = int(seller.get("feedbackScore") or 0)
+        top_rated = bool(seller.get("sellerAccountType") == "BUSINESS")
+
+        return {
+            "source": "ebay",
+            "provider": "ebay",
+            "marketplace": marketplace,
+            "keyword": keyword,
+            "title": title[:160],
+            "price": price,
+            "currency": currency,
+            "image_url": image_url,
+            "url": url2,
+            "seller_feedback": feedback,
+            "top_rated": top_rated
+        }
+    except Exception as e:
+        print(f"[browse] item parse error '{keyword}': {e}")
+        return None
+
+# Per-marketplace pacing of live Browse requests (set by the bot). Only real
+# HTTP calls are paced: cache hits in utils.sources never touch these, while
+# background revalidations and every extra page of iter_browse do.
+_LIMITERS: Dict[str, TokenBucket] = {}
+_JITTER: Dict[str, float] = {}
+
+def set_rate_limit(marketplace: str, rate: float, burst: Optional[float] = None, jitter_max: float = 0.0) -> TokenBucket:
+    """Pace Browse requests for `marketplace` at `rate`/s (<= 0 disables), with optional random jitter."""
+    bucket = TokenBucket(rate, burst=burst)
+    _LIMITERS[marketplace] = bucket
+    _JITTER[marketplace] = max(0.0, float(jitter_max or 0.0))
+    return bucket
+
+def _pace(marketplace: str) -> None:
+    bucket = _LIMITERS.get(marketplace)
+    if bucket is None:
+        return
+    # optional jitter to desynchronize bursts
+    jitter = _JITTER.get(marketplace, 0.0)
+    if jitter > 0:
+        time.sleep(random.uniform(0.0, jitter))
+    bucket.acquire()
+
+def _browse_page(url: str, params: Optional[Dict], keyword: str, marketplace: str = DEFAULT_MARKETPLACE) -> Optional[Dict]:
+    """One Browse request (budgeted); returns the decoded page or None on failure."""
     token = _get_oauth_token()
-    url = "https://api.ebay.com/buy/browse/v1/item_summary/search"
-    params = {
-        "q": keyword,
-        "limit": str(limit),
-        "filter": "priceCurrency:USD",
-        "sort": "BEST_MATCH"
-    }
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
-        "X-EBAY-C-MARKETPLACE-ID": "EBAY_US",
+        "X-EBAY-C-MARKETPLACE-ID": marketplace,
         "User-Agent": "TrendDropBot/1.0",
     }
 
-    # gentle retry (handles transient 5xx)
-    backoffs = [0, 2, 4]
-    r = None
-    for i, b in enumerate(backoffs, start=1):
-        if b: time.sleep(b)
-        r = requests.get(url, headers=headers, params=params, timeout=25)
-        if r.status_code == 200:
-            break
-        print(f"[browse] HTTP {r.status_code} for '{keyword}', attempt {i}/{len(backoffs)}: {r.text[:200]}")
-    if r is None or r.status_code != 200:
-        return []
-
-    data = r.json()
-    items = data.get("itemSummaries", []) or []
-    out: List[Dict] = []
-    for it in items:
-        try:
-            title = it.get("title", "")
-            price_obj = (it.get("price") or {})
-            price = float(price_obj.get("value", 0.0))
-            currency = price_obj.get("currency", "USD")
-            image_url = (it.get("image") or {}).get("imageUrl", "")
-            url2 = it.get("itemWebUrl") or it.get("itemAffiliateWebUrl") or ""
-            seller = (it.get("seller") or {})
-            feedback = int(seller.get("feedbackScore") or 0)
-            top_rated = bool(seller.get("sellerAccountType") == "BUSINESS")
-
-            out.append({
-                "source": "ebay",
-                "provider": "ebay",
-                "keyword": keyword,
-                "title": title[:160],
-                "price": price,
-                "currency": currency,
-                "image_url": image_url,
-                "url": url2,
-                "seller_feedback": feedback,
-                "top_rated": top_rated
-            })
-        except Exception as e:
-            print(f"[browse] item parse error '{keyword}': {e}")
-            continue
-
-    print(f"[browse] '{keyword}' -> {len(out)} items")
-    return out
+    # transient 5xx / connection errors are retried by the shared transport
+    _pace(marketplace)
+    if not try_spend("browse"):
+        print(f"[browse] daily call budget exhausted; skipping '{keyword}' ({marketplace})")
+        return None
+    r = transport.get(url, headers=headers, params=params)
+    retried = transport.retries_used(r)
+    if retried:
+        record_spent("browse", retried)
+    if r.status_code != 200:
+        print(f"[browse] HTTP {r.status_code} for '{keyword}' ({marketplace}) after {retried + 1} attempt(s): {r.text[:200]}")
+        return None
+    return r.json()
 
+def iter_browse(keyword: str, page_size: int = 50, max_items: Optional[int] = None,
+                marketplace: str = DEFAULT_MARKETPLACE) -> Iterator[Dict]:
+    """
+    Lazily walk Browse search results page by page, following the `next` link.
+    Yields parsed items as each page arrives; stops after `max_items` items, when
+    eBay reports no further page, or when the caller stops iterating. Only one
+    page is held in memory at a time.
+    """
+    page_size = max(1, min(int(page_size), _BROWSE_MAX_PAGE))
+    if max_items is not None and max_items <= 0:
+        return
+    url: Optional[str] = _BROWSE_URL
+    params: Optional[Dict] = {
+        "q": keyword,
+        "limit": str(page_size if max_items is None else min(page_size, max_items)),
+        "offset": "0",
+        "filter": f"priceCurrency:{MARKETPLACE_CURRENCY.get(marketplace, 'USD')}",
+        "sort": "BEST_MATCH"
+    }
+    yielded = 0
+    while url:
+        data = _browse_page(url, params, keyword, marketplace)
+        if not data:
+            return
+        items = data.get("itemSummaries", []) or []
+        for it in items:
+            parsed = _parse_item(it, keyword, marketplace)
+            if parsed is None:
+                continue
+            yield parsed
+            yielded += 1
+            if max_items is not None and yielded >= max_items:
+                return
+        # `next` is a fully-formed URL carrying q/limit/offset/filter
+        url = data.get("next") if items else None
+        params = None
 
+def search_browse(keyword: str, limit: int = 12, marketplace: str = DEFAULT_MARKETPLACE) -> List[Dict]:
+    """
+    Use Buy Browse API: /buy/browse/v1/item_summary/search
+    A single request for limit <= 200; larger limits page through iter_browse.
+    """
+    out = list(iter_browse(keyword, page_size=limit, max_items=limit, marketplace=marketplace))
+    print(f"[browse] '{keyword}' ({marketplace}) -> {len(out)} items")
+    return out
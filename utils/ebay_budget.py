@@ -0,0 +1,132 @@
+import os, time, math
+from typing import Dict
+from utils.filelock import file_lock, read_json, atomic_write_json
+from trenddrop.utils.env_loader import env_int, env_flag
+
+# Shared with utils.sources so every bot process on the host sees one budget
+_ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+_CACHE_DIR = os.path.join(_ROOT_DIR, ".cache", "ebay")
+
+
+def _daily_quota() -> int:
+    # Browse API default application quota is 5,000 calls/day
+    return env_int("EBAY_DAILY_BUDGET", 5000)
+
+
+def _reserve() -> int:
+    # calls held back for manual runs / emergencies
+    return max(0, env_int("EBAY_BUDGET_RESERVE", 50))
+
+
+def _pacing_enabled() -> bool:
+    return env_flag("EBAY_BUDGET_PACING", True)
+
+
+def _budget_path() -> str:
+    return os.path.join(_CACHE_DIR, "budget.json")
+
+
+def _lock_path() -> str:
+    return os.path.join(_CACHE_DIR, "budget.lock")
+
+
+def _load_budget() -> Dict:
+    data = read_json(_budget_path(), None)
+    if not isinstance(data, dict):
+        return {"date": "", "count": 0}
+    return data
+
+
+def _save_budget(data) -> None:
+    atomic_write_json(_budget_path(), data)
+
+
+def _rolled(state: Dict, now: float) -> Dict:
+    """Reset the counters on a new (UTC) day and snapshot the count at each new hour."""
+    tm = time.gmtime(now)
+    today = time.strftime("%Y-%m-%d", tm)
+    if state.get("date") != today:
+        state = {"date": today, "count": 0, "hour": tm.tm_hour, "hour_base": 0, "by_kind": {}}
+    if state.get("hour") != tm.tm_hour:
+        state["hour"] = tm.tm_hour
+        state["hour_base"] = int(state.get("count") or 0)
+    state.setdefault("hour_base", 0)
+    state.setdefault("by_kind", {})
+    return state
+
+
+def _hour_cap(state: Dict) -> int:
+    """Even share of what was left at the top of this hour across the hours remaining today."""
+    usable = _daily_quota() - _reserve()
+    hours_left = max(1, 24 - int(state.get("hour") or 0))
+    left_at_hour = max(0, usable - int(state.get("hour_base") or 0))
+    return int(math.ceil(left_at_hour / hours_left))
+
+
+def _allowed(state: Dict, n: int) -> bool:
+    count = int(state.get("count") or 0)
+    if count + n > _daily_quota() - _reserve():
+        return False
+    if _pacing_enabled():
+        spent_this_hour = count - int(state.get("hour_base") or 0)
+        if spent_this_hour + n > _hour_cap(state):
+            return False
+    return True
+
+
+def budget_allows(n: int = 1) -> bool:
+    """Non-consuming check used to decide between a live call and a cached fallback."""
+    try:
+        with file_lock(_lock_path()):
+            return _allowed(_rolled(_load_budget(), time.time()), n)
+    except Exception:
+        return True
+
+
+def try_spend(kind: str = "browse", n: int = 1) -> bool:
+    """
+    Atomically reserve `n` calls of `kind` against today's budget.
+    Returns False (and spends nothing) when the daily quota or hourly share is used up.
+    """
+    try:
+        with file_lock(_lock_path()):
+            state = _rolled(_load_budget(), time.time())
+            if not _allowed(state, n):
+                _save_budget(state)
+                return False
+            state["count"] = int(state.get("count") or 0) + n
+            state["by_kind"][kind] = int(state["by_kind"].get(kind) or 0) + n
+            _save_budget(state)
+            return True
+    except Exception:
+        # never block live calls because the budget file is unusable
+        return True
+
+
+def record_spent(kind: str = "browse", n: int = 1) -> None:
+    """Account for calls that already happened (e.g. transport-level retries)."""
+    try:
+        with file_lock(_lock_path()):
+            state = _rolled(_load_budget(), time.time())
+            state["count"] = int(state.get("count") or 0) + n
+            state["by_kind"][kind] = int(state["by_kind"].get(kind) or 0) + n
+            _save_budget(state)
+    except Exception:
+        pass
+
+
+def budget_status() -> Dict:
+    try:
+        with file_lock(_lock_path()):
+            state = _rolled(_load_budget(), time.time())
+    except Exception:
+        return {}
+    usable = _daily_quota() - _reserve()
+    return {
+        "date": state.get("date"),
+        "count": int(state.get("count") or 0),
+        "remaining": max(0, usable - int(state.get("count") or 0)),
+        "hour_cap": _hour_cap(state),
+        "hour_spent": int(state.get("count") or 0) - int(state.get("hour_base") or 0),
+        "by_kind": dict(state.get("by_kind") or {}),
+    }
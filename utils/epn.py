@@ -5,8 +5,15 @@ from dotenv import load_dotenv, find_dotenv
 # Ensure root .env is loaded
 load_dotenv(find_dotenv(usecwd=True), override=False)
 
+# EPN rotation ids (mkrid) per eBay marketplace
+ROTATION_IDS = {
+	"EBAY_US": "711-53200-19255-0",
+	"EBAY_GB": "710-53481-19255-0",
+	"EBAY_DE": "707-53477-19255-0",
+}
 
-def affiliate_wrap(url: str, custom_id: str = "trenddrop") -> str:
+
+def affiliate_wrap(url: str, custom_id: str = "trenddrop", marketplace: str = "EBAY_US") -> str:
 	"""
 	Add EPN tracking params directly to the item URL to avoid rover 1x1.
 	"""
@@ -19,7 +26,7 @@ def affiliate_wrap(url: str, custom_id: str = "trenddrop") -> str:
 
 	query.update({
 		"mkcid": "1",
-		"mkrid": "711-53200-19255-0",
+		"mkrid": ROTATION_IDS.get(marketplace or "EBAY_US", ROTATION_IDS["EBAY_US"]),
 		"mkevt": "1",
 		"campid": campid,
 		"customid": custom_id or "trenddrop",
@@ -0,0 +1,86 @@
+import os, json, threading
+from contextlib import contextmanager
+
+try:
+    import fcntl  # type: ignore
+except Exception:
+    fcntl = None  # type: ignore
+
+try:
+    import msvcrt  # type: ignore
+except Exception:
+    msvcrt = None  # type: ignore
+
+_THREAD_LOCKS = {}
+_THREAD_LOCKS_GUARD = threading.Lock()
+
+
+def _thread_lock(path: str) -> threading.Lock:
+    with _THREAD_LOCKS_GUARD:
+        lock = _THREAD_LOCKS.get(path)
+        if lock is None:
+            lock = _THREAD_LOCKS[path] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Exclusive lock shared by threads of this process and by other processes
+    using the same lock file (flock on POSIX, msvcrt on Windows).
+    Degrades to a thread-only lock where neither is available.
+    """
+    tlock = _thread_lock(os.path.abspath(path))
+    with tlock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        f = open(path, "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            yield
+        finally:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            except Exception:
+                pass
+            f.close()
+
+
+def read_json(path: str, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def atomic_write_json(path: str, data) -> bool:
+    """Write JSON to a sibling temp file and rename it into place. Returns False on failure."""
+    try:
+        payload = json.dumps(data).encode("utf-8")
+    except Exception:
+        return False
+    return atomic_write_bytes(path, payload)
+
+
+def atomic_write_bytes(path: str, data: bytes) -> bool:
+    """Write bytes to a sibling temp file and rename it into place. Returns False on failure."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return True
+    except Exception:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+        return False
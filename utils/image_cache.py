@@ -0,0 +1,271 @@
+import os, time, hashlib, sqlite3, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from trenddrop.utils import transport
+from trenddrop.utils.env_loader import env_float, env_flag
+
+# Shared on-disk cache for product images (OG banner, report pages, perceptual
+# hashing). Bodies are stored once per content digest under blobs/; index.sqlite
+# maps each URL to its digest plus the validators needed to revalidate it.
+# Fresh entries (IMAGE_CACHE_TTL_HOURS) are served locally; stale ones are
+# revalidated with If-None-Match / If-Modified-Since and served from disk on 304
+# or on network failure. Past IMAGE_CACHE_MAX_MB, least recently used go first;
+# the cap is enforced after every prefetch and periodically as images are written.
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+_CACHE_DIR = os.path.join(_ROOT_DIR, ".cache", "images")
+_BLOB_DIR = os.path.join(_CACHE_DIR, "blobs")
+_INDEX_PATH = os.path.join(_CACHE_DIR, "index.sqlite")
+
+_STATS = {"hit": 0, "revalidated": 0, "miss": 0, "stale": 0, "evicted": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _bump(name: str, n: int = 1) -> None:
+    with _STATS_LOCK:
+        _STATS[name] += n
+
+
+def cache_stats() -> Dict[str, int]:
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+
+def _ttl_secs() -> float:
+    return env_float("IMAGE_CACHE_TTL_HOURS", 24.0) * 3600
+
+
+def _max_bytes() -> int:
+    return int(env_float("IMAGE_CACHE_MAX_MB", 200.0) * 1024 * 1024)
+
+
+# get_image_bytes re-checks the size cap after this many newly written bytes
+_EVICT_EVERY_BYTES = 16 * 1024 * 1024
+_written_since_evict = 0
+
+
+def _blob_path(digest: str) -> str:
+    return os.path.join(_BLOB_DIR, digest[:2], digest)
+
+
+def _write_blob(data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+    return digest
+
+
+def _read_blob(digest: Optional[str]) -> Optional[bytes]:
+    if not digest:
+        return None
+    try:
+        with open(_blob_path(digest), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class _Index:
+    def __init__(self, path: str = _INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            "url TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL, "
+            "etag TEXT, last_modified TEXT, fetched REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS images_last_used ON images (last_used)")
+        self.db.commit()
+
+    def get(self, url: str) -> Optional[tuple]:
+        with self.lock:
+            return self.db.execute(
+                "SELECT digest, etag, last_modified, fetched FROM images WHERE url = ?", (url,)
+            ).fetchone()
+
+    def touch(self, url: str, fetched: Optional[float] = None) -> None:
+        now = time.time()
+        with self.lock:
+            if fetched is None:
+                self.db.execute("UPDATE images SET last_used = ? WHERE url = ?", (now, url))
+            else:
+                self.db.execute("UPDATE images SET last_used = ?, fetched = ? WHERE url = ?", (now, fetched, url))
+            self.db.commit()
+
+    def put(self, url: str, digest: str, size: int, etag: Optional[str], last_modified: Optional[str]) -> None:
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO images (url, digest, size, etag, last_modified, fetched, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, size, etag, last_modified, now, now),
+            )
+            self.db.commit()
+
+    def release_blob(self, digest: Optional[str]) -> None:
+        """Delete a blob once no URL points at it (after a URL moved to new bytes, or a failed put)."""
+        if not digest:
+            return
+        with self.lock:
+            if self.db.execute("SELECT 1 FROM images WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+                return
+            try:
+                os.unlink(_blob_path(digest))
+            except OSError:
+                pass
+
+    def evict(self, max_bytes: int) -> int:
+        """Drop least recently used URLs until blobs fit in max_bytes; returns URLs removed."""
+        removed = 0
+        with self.lock:
+            total = self.db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT digest, MAX(size) AS size FROM images GROUP BY digest)"
+            ).fetchone()[0]
+            if total <= max_bytes:
+                return 0
+            rows = self.db.execute("SELECT url, digest, size FROM images ORDER BY last_used").fetchall()
+            for url, digest, size in rows:
+                if total <= max_bytes:
+                    break
+                self.db.execute("DELETE FROM images WHERE url = ?", (url,))
+                removed += 1
+                # blobs are shared by every URL serving identical bytes
+                if not self.db.execute("SELECT 1 FROM images WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+                    try:
+                        os.unlink(_blob_path(digest))
+                    except OSError:
+                        pass
+                    total -= size
+            self.db.commit()
+        return removed
+
+
+_INDEX: Optional[_Index] = None
+_INDEX_INIT_LOCK = threading.Lock()
+
+
+def _index() -> Optional[_Index]:
+    global _INDEX
+    with _INDEX_INIT_LOCK:
+        if _INDEX is None:
+            try:
+                _INDEX = _Index()
+            except Exception as e:
+                print(f"[images] cache unavailable: {e}")
+                return None
+        return _INDEX
+
+
+def _evict(idx: _Index) -> None:
+    global _written_since_evict
+    with _STATS_LOCK:
+        _written_since_evict = 0
+    try:
+        _bump("evicted", idx.evict(_max_bytes()))
+    except Exception as e:
+        print(f"[images] eviction failed: {e}")
+
+
+def _maybe_evict(idx: _Index, added: int) -> None:
+    """Evict once enough bytes were written since the last pass (min(16 MB, 5% of the cap))."""
+    global _written_since_evict
+    with _STATS_LOCK:
+        _written_since_evict += added
+        due = _written_since_evict >= max(1, min(_EVICT_EVERY_BYTES, _max_bytes() // 20))
+    if due:
+        _evict(idx)
+
+
+def _cache_enabled() -> bool:
+    return env_flag("IMAGE_CACHE", True)
+
+
+def _download(url: str, timeout: float, headers: Optional[Dict[str, str]] = None):
+    try:
+        return transport.get(url, headers=headers or None, timeout=timeout)
+    except Exception:
+        return None
+
+
+def get_image_bytes(url: str, timeout: float = 12) -> Optional[bytes]:
+    """Image body for `url`, from the local cache when fresh, else fetched (conditionally) and stored."""
+    if not url:
+        return None
+    idx = _index() if _cache_enabled() else None
+    if idx is None:
+        r = _download(url, timeout)
+        return r.content if r is not None and r.status_code == 200 and r.content else None
+
+    row = idx.get(url)
+    cached = _read_blob(row[0]) if row else None
+    if cached is not None and time.time() - float(row[3]) <= _ttl_secs():
+        idx.touch(url)
+        _bump("hit")
+        return cached
+
+    headers: Dict[str, str] = {}
+    if cached is not None:
+        if row[1]:
+            headers["If-None-Match"] = row[1]
+        if row[2]:
+            headers["If-Modified-Since"] = row[2]
+    r = _download(url, timeout, headers)
+    if cached is not None and (r is None or r.status_code == 304 or r.status_code >= 500):
+        if r is not None and r.status_code == 304:
+            idx.touch(url, fetched=time.time())
+            _bump("revalidated")
+        else:
+            idx.touch(url)
+            _bump("stale")
+        return cached
+    if r is None or r.status_code != 200 or not r.content:
+        return None
+    _bump("miss")
+    digest = None
+    try:
+        digest = _write_blob(r.content)
+        idx.put(url, digest, len(r.content), r.headers.get("ETag"), r.headers.get("Last-Modified"))
+    except Exception as e:
+        print(f"[images] cache write failed: {e}")
+        try:
+            idx.release_blob(digest)
+        except Exception:
+            pass
+        return r.content
+    if row and row[0] != digest:
+        # the URL now serves different bytes; its old blob may be unreferenced
+        try:
+            idx.release_blob(row[0])
+        except Exception:
+            pass
+    _maybe_evict(idx, len(r.content))
+    return r.content
+
+
+def prefetch(urls: Iterable[str], concurrency: Optional[int] = None, timeout: float = 12) -> Dict[str, bool]:
+    """Warm the cache for `urls` in parallel; returns {url: available}. Evicts past the size cap afterwards."""
+    todo = list(dict.fromkeys(u for u in urls if u))
+    if not todo:
+        return {}
+    workers = concurrency or max(1, int(env_float("IMAGE_PREFETCH_CONCURRENCY", 8)))
+    with ThreadPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+        results = list(pool.map(lambda u: get_image_bytes(u, timeout=timeout) is not None, todo))
+    idx = _index() if _cache_enabled() else None
+    if idx is not None:
+        _evict(idx)
+    return dict(zip(todo, results))
@@ -0,0 +1,177 @@
+import re, random, zlib
+from typing import Callable, Dict, List, Optional, Sequence
+
+from trenddrop.utils.env_loader import env_float
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+# Near-duplicate listing detection: word-bigram shingles of the normalized title,
+# MinHash signatures, and LSH banding so only listings sharing a band bucket are
+# ever compared. Cost is O(n * num_perm), never pairwise.
+
+_PRIME = (1 << 31) - 1  # (a * h + b) with 31-bit a/b and 32-bit h fits in uint64
+_MASK32 = (1 << 32) - 1
+
+
+def normalize_title(t: Optional[str]) -> str:
+    if not t:
+        return ""
+    t = t.lower()
+    t = re.sub(r"\s+", " ", t)
+    t = re.sub(r"[^\w\s]+", "", t)
+    return t.strip()
+
+
+def shingles(text: str, k: int = 2) -> set:
+    words = text.split()
+    if len(words) <= k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def _hash32(s: str) -> int:
+    return zlib.crc32(s.encode("utf-8")) & _MASK32
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._a = [rng.randrange(1, _PRIME) for _ in range(num_perm)]
+        self._b = [rng.randrange(0, _PRIME) for _ in range(num_perm)]
+        if np is not None:
+            self._a_np = np.array(self._a, dtype=np.uint64)[:, None]
+            self._b_np = np.array(self._b, dtype=np.uint64)[:, None]
+
+    def signature(self, grams: set) -> tuple:
+        if not grams:
+            return ()
+        hs = [_hash32(g) for g in grams]
+        if np is not None:
+            h = np.array(hs, dtype=np.uint64)[None, :]
+            return tuple(((self._a_np * h + self._b_np) % _PRIME).min(axis=1).tolist())
+        return tuple(min((a * x + b) % _PRIME for x in hs) for a, b in zip(self._a, self._b))
+
+    def _permute(self, h) -> "np.ndarray":
+        # x mod (2^31 - 1) via the Mersenne fold; much cheaper than uint64 `%`
+        x = self._a_np * h + self._b_np
+        x = (x & _PRIME) + (x >> 31)
+        x = (x & _PRIME) + (x >> 31)
+        return np.where(x >= _PRIME, x - _PRIME, x)
+
+    def signature_matrix(self, grams_list: Sequence[set], chunk: int = 2000):
+        """(n, num_perm) uint64 signatures plus a mask of documents that had any shingles."""
+        n = len(grams_list)
+        sigs = np.zeros((n, self.num_perm), dtype=np.uint64)
+        present = np.fromiter((bool(g) for g in grams_list), dtype=bool, count=n)
+        hashed: Dict[str, int] = {}  # titles share most shingles; hash each once
+        for start in range(0, n, chunk):
+            block = grams_list[start:start + chunk]
+            lengths = [len(g) for g in block if g]
+            if not lengths:
+                continue
+            flat = [hashed[x] if x in hashed else hashed.setdefault(x, _hash32(x)) for g in block for x in g]
+            perm = self._permute(np.array(flat, dtype=np.uint64)[None, :])
+            offsets = np.cumsum([0] + lengths[:-1])
+            rows = np.nonzero(present[start:start + chunk])[0] + start
+            sigs[rows] = np.minimum.reduceat(perm, offsets, axis=1).T
+        return sigs, present
+
+
+def _similarity(s1: tuple, s2: tuple) -> float:
+    return sum(1 for x, y in zip(s1, s2) if x == y) / float(len(s1) or 1)
+
+
+def _candidate_pairs_np(sigs, present, bands: int, rows: int, threshold: float):
+    """Pairs (i, j) that share an LSH band bucket and pass the signature similarity check."""
+    idx = np.nonzero(present)[0]
+    if len(idx) < 2:
+        return []
+    sub = sigs[idx]
+    # fold each band's rows into one 64-bit bucket key (wrapping multiply-add)
+    mult = np.array([0x9E3779B97F4A7C15 >> s for s in range(rows)], dtype=np.uint64)
+    pairs = set()
+    with np.errstate(over="ignore"):
+        for band in range(bands):
+            keys = (sub[:, band * rows:(band + 1) * rows] * mult).sum(axis=1, dtype=np.uint64)
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            head = first[inverse.ravel()]
+            members = np.nonzero(head != np.arange(len(idx)))[0]
+            for i, j in zip(idx[members].tolist(), idx[head[members]].tolist()):
+                pairs.add((i, j))
+    if not pairs:
+        return []
+    left = np.fromiter((p[0] for p in pairs), dtype=np.int64, count=len(pairs))
+    right = np.fromiter((p[1] for p in pairs), dtype=np.int64, count=len(pairs))
+    sim = (sigs[left] == sigs[right]).mean(axis=1)
+    keep = sim >= threshold
+    return list(zip(left[keep].tolist(), right[keep].tolist()))
+
+
+def _candidate_pairs_py(texts: Sequence[str], hasher: MinHasher, bands: int, rows: int, threshold: float):
+    buckets: Dict[tuple, int] = {}
+    sigs = [hasher.signature(shingles(t)) for t in texts]
+    pairs = []
+    for i, sig in enumerate(sigs):
+        if not sig:
+            continue
+        for band in range(bands):
+            j = buckets.setdefault((band, sig[band * rows:(band + 1) * rows]), i)
+            if j != i and _similarity(sig, sigs[j]) >= threshold:
+                pairs.append((i, j))
+    return pairs
+
+
+def cluster_labels(texts: Sequence[str], threshold: float = 0.6, num_perm: int = 64, bands: int = 16) -> List[int]:
+    """
+    Cluster ids for `texts` (already normalized). Items share an id when their
+    estimated Jaccard similarity reaches `threshold`, directly or transitively.
+    """
+    rows = max(1, num_perm // max(1, bands))
+    hasher = MinHasher(num_perm=rows * bands)
+    if np is not None:
+        sigs, present = hasher.signature_matrix([shingles(t) for t in texts])
+        pairs = _candidate_pairs_np(sigs, present, bands, rows, threshold)
+    else:
+        pairs = _candidate_pairs_py(texts, hasher, bands, rows, threshold)
+
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    return [find(i) for i in range(len(texts))]
+
+
+def _threshold() -> float:
+    return env_float("NEARDUP_THRESHOLD", 0.6)
+
+
+def collapse_near_duplicates(items: Sequence[Dict], scores: Optional[Sequence[float]] = None,
+                             threshold: Optional[float] = None,
+                             title: Callable[[Dict], Optional[str]] = lambda p: p.get("title")) -> List[Dict]:
+    """
+    Keep only the best-scored listing of each near-duplicate title cluster
+    (first one wins ties). Survivors keep their input order.
+    """
+    if not items:
+        return []
+    scores = list(scores) if scores is not None else [float(p.get("score") or 0.0) for p in items]
+    labels = cluster_labels([normalize_title(title(p)) for p in items],
+                            threshold=_threshold() if threshold is None else threshold)
+    best: Dict[int, int] = {}
+    for i, lab in enumerate(labels):
+        if lab not in best or scores[i] > scores[best[lab]]:
+            best[lab] = i
+    keep = sorted(best.values())
+    return [items[i] for i in keep]
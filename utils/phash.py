@@ -0,0 +1,195 @@
+import os, time, threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils.image_cache import get_image_bytes
+from utils.filelock import file_lock, read_json, atomic_write_json
+from trenddrop.utils.env_loader import env_float
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None  # type: ignore
+
+# Perceptual (difference) hashes of listing thumbnails, so the same stock photo
+# under different titles/URLs is recognised. Hashes are cached per image URL in
+# .cache/images/dhash.json and looked up through a BK-tree (Hamming metric),
+# seeded with the hashes of photos posted in earlier runs.
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+_CACHE_DIR = os.path.join(_ROOT_DIR, ".cache", "images")
+_HASH_PATH = os.path.join(_CACHE_DIR, "dhash.json")
+
+
+def dhash(data: bytes, size: int = 8) -> Optional[int]:
+    """64-bit difference hash: compares horizontally adjacent pixels of a 9x8 grayscale thumbnail."""
+    if Image is None or not data:
+        return None
+    try:
+        img = Image.open(BytesIO(data)).convert("L").resize((size + 1, size), Image.LANCZOS)
+    except Exception:
+        return None
+    px = list(img.getdata())
+    value = 0
+    for row in range(size):
+        base = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (1 if px[base + col] > px[base + col + 1] else 0)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes; radius queries touch only a fraction of nodes."""
+
+    def __init__(self):
+        self._root: Optional[list] = None  # [hash, values, {distance: child}]
+        self.size = 0
+
+    def add(self, h: int, value) -> None:
+        self.size += 1
+        if self._root is None:
+            self._root = [h, [value], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [value], {}]
+                return
+            node = child
+
+    def search(self, h: int, max_distance: int) -> List[Tuple[int, object]]:
+        out: List[Tuple[int, object]] = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_distance:
+                out.extend((d, v) for v in node[1])
+            lo, hi = d - max_distance, d + max_distance
+            stack.extend(child for dist, child in node[2].items() if lo <= dist <= hi)
+        return out
+
+
+class HashCache:
+    """Persistent url -> dHash map with TTL and entry cap, safe across processes."""
+
+    def __init__(self, path: str = _HASH_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict] = {}
+        self._dirty: Dict[str, Dict] = {}
+        raw = read_json(path, {}) or {}
+        self._data = raw if isinstance(raw, dict) else {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str) -> Optional[int]:
+        entry = self._data.get(url)
+        ttl = env_float("PHASH_CACHE_TTL_DAYS", 30.0) * 86400
+        if entry and time.time() - float(entry.get("ts") or 0) <= ttl:
+            self.hits += 1
+            return int(entry["h"], 16)
+        self.misses += 1
+        return None
+
+    def put(self, url: str, h: int) -> None:
+        entry = {"h": format(h, "016x"), "ts": time.time()}
+        with self._lock:
+            self._data[url] = entry
+            self._dirty[url] = entry
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        ttl = env_float("PHASH_CACHE_TTL_DAYS", 30.0) * 86400
+        cap = int(env_float("PHASH_CACHE_MAX", 50000))
+        with file_lock(self.path + ".lock"):
+            # merge with entries other processes wrote since we loaded
+            merged = read_json(self.path, {}) or {}
+            merged = merged if isinstance(merged, dict) else {}
+            with self._lock:
+                merged.update(self._dirty)
+                self._dirty = {}
+            now = time.time()
+            merged = {u: e for u, e in merged.items() if now - float(e.get("ts") or 0) <= ttl}
+            if len(merged) > cap:
+                newest = sorted(merged.items(), key=lambda kv: float(kv[1].get("ts") or 0), reverse=True)[:cap]
+                merged = dict(newest)
+            atomic_write_json(self.path, merged)
+            self._data = merged
+
+
+def _fetch_thumbnail(url: str) -> Optional[bytes]:
+    try:
+        return get_image_bytes(url, timeout=10)
+    except Exception:
+        return None
+
+
+def image_hashes(urls: Sequence[str], cache: Optional[HashCache] = None) -> Dict[str, int]:
+    """dHash for each URL: cached values first, misses fetched in parallel and cached."""
+    cache = cache or HashCache()
+    out: Dict[str, int] = {}
+    missing: List[str] = []
+    for u in dict.fromkeys(u for u in urls if u):
+        h = cache.get(u)
+        if h is None:
+            missing.append(u)
+        else:
+            out[u] = h
+    if missing and Image is not None:
+        workers = max(1, int(env_float("PHASH_CONCURRENCY", 8)))
+        with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as pool:
+            for u, data in zip(missing, pool.map(_fetch_thumbnail, missing)):
+                h = dhash(data) if data else None
+                if h is not None:
+                    out[u] = h
+                    cache.put(u, h)
+        try:
+            cache.save()
+        except Exception as e:
+            print(f"[phash] cache save failed: {e}")
+    return out
+
+
+def dedupe_by_image(items: Sequence[Dict], max_distance: Optional[int] = None,
+                    scores: Optional[Sequence[float]] = None,
+                    posted: Optional[Iterable[int]] = None) -> List[Dict]:
+    """
+    Drop listings whose thumbnail is within `max_distance` bits (PHASH_MAX_DISTANCE,
+    default 4) of a better-scored listing's, or of any hash in `posted` (photos
+    posted in earlier runs, see utils.seen). Items without a usable image are
+    kept. Survivors keep their input order.
+    """
+    if not items or Image is None:
+        return list(items)
+    if max_distance is None:
+        max_distance = int(env_float("PHASH_MAX_DISTANCE", 4))
+    scores = list(scores) if scores is not None else [float(p.get("score") or 0.0) for p in items]
+    hashes = image_hashes([p.get("image_url") or "" for p in items])
+    tree = BKTree()
+    for h in posted or ():
+        tree.add(h, None)
+    keep = set()
+    # best first, so the survivor of each look-alike group is its top-scored listing
+    for i in sorted(range(len(items)), key=lambda i: -scores[i]):
+        h = hashes.get(items[i].get("image_url") or "")
+        if h is None:
+            keep.add(i)
+            continue
+        if tree.search(h, max_distance):
+            continue
+        tree.add(h, i)
+        keep.add(i)
+    return [items[i] for i in sorted(keep)]
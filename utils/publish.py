@@ -1,6 +1,6 @@
-import os, json, time, requests, pathlib, html
+import os, time, pathlib, html, hashlib
 from pathlib import Path
-from trenddrop.utils.env_loader import load_env_once
+from trenddrop.utils.env_loader import load_env_once, env_float, env_flag
 
 # Ensure root .env is loaded
 ENV_PATH = load_env_once()
@@ -9,7 +9,11 @@ from typing import List, Dict
 from utils.db import save_run_summary, upsert_products
 from trenddrop.utils.telegram_cta import maybe_send_cta
 from utils.epn import affiliate_wrap
-from utils.ai import caption_for, marketing_copy_for
+from utils.ai import enrich_copy
+from utils.image_cache import get_image_bytes, prefetch
+from utils.site_data import publish_products, publish_catalog
+from trenddrop.telegram_queue import TelegramQueue
+from trenddrop.utils import transport
 
 DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "docs")
 DOCS_DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), "docs", "data")
@@ -18,8 +22,10 @@ OG_PATH = os.path.join(DOCS_DIR, "og.png")
 
 try:
     from PIL import Image, ImageDraw, ImageFont
+    from PIL.PngImagePlugin import PngInfo
 except Exception:
     Image = None  # type: ignore
+    PngInfo = None  # type: ignore
     ImageDraw = None  # type: ignore
     ImageFont = None  # type: ignore
 
@@ -28,6 +34,71 @@ def ensure_dirs():
     pathlib.Path(DOCS_DATA).mkdir(parents=True, exist_ok=True)
 
 
+# bump when the banner layout below changes so existing og.png files are redrawn
+_OG_LAYOUT_VERSION = "og-v1"
+_OG_HASH_KEY = "trenddrop-og-inputs"
+_OG_THUMB_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "og", "thumbs")
+_OG_THUMB_SIZE = (260, 260)
+
+
+def _og_thumb_path(url: str) -> str:
+    name = hashlib.sha256(f"{url}|{_OG_THUMB_SIZE}".encode("utf-8")).hexdigest() + ".png"
+    return os.path.join(_OG_THUMB_DIR, name)
+
+
+def _og_thumbnail(url: str):
+    """(digest, RGB thumbnail) for an image URL; resized copies live in .cache/og/thumbs."""
+    path = _og_thumb_path(url)
+    ttl = env_float("OG_THUMB_TTL_HOURS", 168.0) * 3600
+    try:
+        if time.time() - os.path.getmtime(path) <= ttl:
+            with open(path, "rb") as f:
+                raw = f.read()
+            t = Image.open(BytesIO(raw))  # type: ignore
+            t.load()
+            return hashlib.sha256(raw).hexdigest(), t.convert("RGB")
+    except Exception:
+        pass
+    data = get_image_bytes(url, timeout=10)
+    if not data:
+        return None
+    try:
+        t = Image.open(BytesIO(data)).convert("RGB")  # type: ignore
+        t.thumbnail(_OG_THUMB_SIZE)
+        buf = BytesIO()
+        t.save(buf, format="PNG")
+        raw = buf.getvalue()
+    except Exception:
+        return None
+    try:
+        pathlib.Path(_OG_THUMB_DIR).mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(raw)
+        os.replace(tmp, path)
+    except Exception:
+        pass
+    return hashlib.sha256(raw).hexdigest(), t
+
+
+def _prune_og_thumbnails(max_age_secs: float) -> None:
+    try:
+        now = time.time()
+        for entry in os.scandir(_OG_THUMB_DIR):
+            if entry.is_file() and now - entry.stat().st_mtime > max_age_secs:
+                os.unlink(entry.path)
+    except Exception:
+        pass
+
+
+def _og_existing_hash() -> str:
+    try:
+        with Image.open(OG_PATH) as im:  # type: ignore
+            return str(getattr(im, "text", {}).get(_OG_HASH_KEY) or "")
+    except Exception:
+        return ""
+
+
 def _generate_og_image(products: List[Dict]) -> None:
     if Image is None:
         return
@@ -38,6 +109,28 @@ def _generate_og_image(products: List[Dict]) -> None:
         text_primary = (255, 255, 255)
         text_secondary = (226, 232, 240)  # slate-200
 
+        # Up to 3 product thumbnails, skipping broken images. Only candidates without a
+        # cached thumbnail are fetched (in parallel, with spares for broken ones).
+        candidates = [p.get("image_url") for p in products if p.get("image_url")]
+        uncached = [u for u in candidates[:6] if not os.path.exists(_og_thumb_path(u))]
+        if uncached:
+            prefetch(uncached, timeout=10)
+        thumbs = []
+        for url in candidates:
+            if len(thumbs) >= 3:
+                break
+            got = _og_thumbnail(url)
+            if got:
+                thumbs.append(got)
+
+        # Skip the redraw when layout, date and thumbnails are unchanged
+        ts = time.strftime("Updated %b %d, %Y", time.gmtime())
+        inputs = hashlib.sha256(
+            "|".join([_OG_LAYOUT_VERSION, ts] + [digest for digest, _ in thumbs]).encode("utf-8")
+        ).hexdigest()
+        if os.path.exists(OG_PATH) and _og_existing_hash() == inputs:
+            return
+
         img = Image.new("RGB", (width, height), bg_color)
         draw = ImageDraw.Draw(img)
 
@@ -62,60 +155,49 @@ def _generate_og_image(products: List[Dict]) -> None:
         draw.text((60, 140), title, fill=text_primary, font=f_title)
         draw.text((64, 240), subtitle, fill=text_secondary, font=f_sub)
 
-        # Optional: paste up to 3 product thumbnails on the right
+        # Thumbnails stacked on the right
         x = width - 60
         y = 110
-        thumb_w, thumb_h = 260, 260
         spacing = 12
-        pasted = 0
-        for p in products:
-            if pasted >= 3:
-                break
-            url = p.get("image_url")
-            if not url:
-                continue
+        for _, t in thumbs:
             try:
-                r = requests.get(url, timeout=10)
-                if r.status_code != 200:
-                    continue
-                t = Image.open(BytesIO(r.content))  # type: ignore
-            except Exception:
-                continue
-            try:
-                t = t.convert("RGB")
-                t.thumbnail((thumb_w, thumb_h))
                 x_pos = x - t.width
                 draw.rectangle([(x_pos - 6, y - 6), (x_pos + t.width + 6, y + t.height + 6)], fill=(30, 41, 59))
                 img.paste(t, (x_pos, y))
                 y += t.height + spacing
-                pasted += 1
             except Exception:
                 continue
 
         # Tagline footer
-        ts = time.strftime("Updated %b %d, %Y", time.gmtime())
         draw.text((60, height - 80), ts, fill=(148, 163, 184), font=f_tag)
 
-        # Save
-        img.save(OG_PATH, format="PNG", optimize=True)
+        # Save (inputs hash travels in a tEXt chunk for the next run's comparison)
+        meta = PngInfo() if PngInfo else None
+        if meta is not None:
+            meta.add_text(_OG_HASH_KEY, inputs)
+        img.save(OG_PATH, format="PNG", optimize=True, pnginfo=meta)
+        _prune_og_thumbnails(7 * 86400)
     except Exception:
         # soft-fail; skip OG generation
         return
 
 def update_storefront(products: List[Dict]):
-    # enrich captions for site/telegram
-    for p in products:
+    # enrich captions for site/telegram: batched, concurrent, bounded by a stage deadline
+    try:
+        copies = enrich_copy(products)
+    except Exception:
+        copies = [{} for _ in products]
+    for p, mc in zip(products, copies):
         try:
-            p["caption"] = caption_for(p)
-            # add structured marketing copy
-            mc = marketing_copy_for(p)
+            p["caption"] = mc.get("caption") or p.get("title", "")
             p["headline"] = mc.get("headline")
             p["blurb"] = mc.get("blurb")
             p["emojis"] = mc.get("emojis")
             # ensure affiliate params present
             try:
                 first_tag = (p.get("tags") or [p.get("keyword") or "trend"]) [0]
-                p["url"] = affiliate_wrap(p.get("url", ""), custom_id=str(first_tag).replace(" ", "_")[:40])
+                p["url"] = affiliate_wrap(p.get("url", ""), custom_id=str(first_tag).replace(" ", "_")[:40],
+                                          marketplace=p.get("marketplace") or "EBAY_US")
             except Exception:
                 pass
         except Exception:
@@ -132,8 +214,18 @@ def update_storefront(products: List[Dict]):
                     p["click_url"] = f"{base}?" + urlencode({"url": target})
         except Exception:
             pass
-    with open(PRODUCTS_PATH, "w", encoding="utf-8") as f:
-        json.dump({"updated_at": int(time.time()), "products": products}, f, indent=2)
+    # atomic, compact, precompressed; left untouched when the pick set is unchanged
+    version, status = publish_products(PRODUCTS_PATH, products)
+    if status == "failed":
+        print(f"[publish] WARN products.json version={version} write FAILED; the site keeps the previous file")
+    else:
+        print(f"[publish] products.json version={version} {status}")
+    # paged + per-tag shards for the site (only changed shards are rewritten)
+    try:
+        shard_stats = publish_catalog(DOCS_DATA, products)
+        print(f"[publish] {'WARN ' if shard_stats['failed'] else ''}catalog shards: {shard_stats}")
+    except Exception as e:
+        print(f"[publish] WARN catalog shards failed: {e}")
     # Generate or refresh OG image banner (best-effort)
     try:
         _generate_og_image(products)
@@ -145,60 +237,129 @@ def update_storefront(products: List[Dict]):
     except Exception:
         pass
 
-def post_telegram(products: List[Dict], limit=5):
-    token = os.environ.get("TELEGRAM_BOT_TOKEN")
-    chat_id = os.environ.get("TELEGRAM_CHAT_ID")
-    if not token or not chat_id or not products:
-        return
+def _telegram_caption(p: Dict) -> str:
+    # prefer AI headline; fallback to title
+    title_raw = str(p.get("headline") or p.get("title") or "")
+    title = html.escape(title_raw)
+    price = p.get("price")
+    currency = p.get("currency", "USD")
+    # ensure affiliate params present again for safety
+    try:
+        first_tag = (p.get("tags") or [p.get("keyword") or "trend"]) [0]
+        url = affiliate_wrap(p.get("url", ""), custom_id=str(first_tag).replace(" ", "_")[:40],
+                             marketplace=p.get("marketplace") or "EBAY_US")
+    except Exception:
+        url = p.get("url", "")
+    # combine AI blurb + old caption for redundancy
+    blurb = str(p.get("blurb") or "").strip()
+    caption_extra = blurb if blurb else (p.get("caption") or "")
+    price_text = f"{currency} {price:.2f}" if isinstance(price, (int, float)) else f"{currency} {price}"
+    emoji_pack = p.get("emojis") or ""
+    cap_body = html.escape(caption_extra)
+    if emoji_pack:
+        cap_body = f"{emoji_pack} {cap_body}"
+    return f"✅ <b>{title}</b> — {price_text}\n{cap_body}\n<a href=\"{url}\">View</a>"
 
-    api = f"https://api.telegram.org/bot{token}"
-    pick = products[:limit]
+
+def _telegram_targets(chat_id: str) -> List[str]:
+    targets = [chat_id]
+    # the channel gets drops too only when asked (TELEGRAM_POST_TO_CHANNEL=1)
+    channel = (os.environ.get("TELEGRAM_CHANNEL_ID") or "").strip()
+    if channel and env_flag("TELEGRAM_POST_TO_CHANNEL", False):
+        targets.append(channel)
+    return list(dict.fromkeys(targets))
+
+
+def _post_queued(queue: TelegramQueue, chat_id: str, targets: List[str], pick: List[Dict]) -> None:
+    # albums (sendMediaGroup, up to 10 photos each) are opt-in via TELEGRAM_ALBUMS=1
+    albums = env_flag("TELEGRAM_ALBUMS", False)
+    album: List[Dict] = []
+
+    def _enqueue_album() -> None:
+        if len(album) == 1:
+            only = album[0]
+            for target in targets:
+                queue.enqueue(target, "sendPhoto", {"photo": only["media"], "caption": only["caption"], "parse_mode": "HTML"})
+        elif album:
+            for target in targets:
+                # each photo counts as one message against Telegram's limits
+                queue.enqueue(target, "sendMediaGroup", {"media": list(album)}, cost=len(album))
+        album.clear()
+
+    # everything goes through the durable outbox first; flush() also retries
+    # whatever earlier runs could not deliver
     for p in pick:
         try:
-            # prefer AI headline; fallback to title
-            title_raw = str(p.get("headline") or p.get("title") or "")
-            title = html.escape(title_raw)
-            price = p.get("price")
-            currency = p.get("currency", "USD")
-            # ensure affiliate params present again for safety
+            caption = _telegram_caption(p)
+            img = p.get("image_url")
+            if img and albums:
+                album.append({"type": "photo", "media": img, "caption": caption, "parse_mode": "HTML"})
+                if len(album) >= 10:
+                    _enqueue_album()
+                continue
+            for target in targets:
+                if img:
+                    queue.enqueue(target, "sendPhoto", {"photo": img, "caption": caption, "parse_mode": "HTML"})
+                else:
+                    queue.enqueue(target, "sendMessage", {
+                        "text": caption,
+                        "parse_mode": "HTML",
+                        "disable_web_page_preview": True,
+                    })
+        except Exception:
+            # best-effort; continue with next product
+            continue
+    try:
+        _enqueue_album()
+    except Exception:
+        pass
+    try:
+        sent = queue.flush()
+    except Exception as e:
+        print(f"[telegram] flush failed: {e}")
+        sent = []
+    finally:
+        queue.close()
+    print(f"[telegram] outbox: {queue.stats}")
+    # After each delivered product message, maybe trigger CTA based on batch + cooldown
+    for m in sent:
+        if m["chat_id"] != str(chat_id):
+            continue
+        if m["method"] == "sendMediaGroup":
+            delivered = len(m["payload"].get("media") or [])
+        elif m["method"] in ("sendPhoto", "sendMessage"):
+            delivered = 1
+        else:
+            continue
+        for _ in range(delivered):
             try:
-                first_tag = (p.get("tags") or [p.get("keyword") or "trend"]) [0]
-                url = affiliate_wrap(p.get("url", ""), custom_id=str(first_tag).replace(" ", "_")[:40])
+                maybe_send_cta()
             except Exception:
-                url = p.get("url", "")
+                pass
+
+
+def _post_direct(token: str, targets: List[str], pick: List[Dict]) -> None:
+    """One request per message, no outbox; used when the outbox cannot be opened."""
+    api = f"https://api.telegram.org/bot{token}"
+    for p in pick:
+        try:
+            caption = _telegram_caption(p)
             img = p.get("image_url")
-            # combine AI blurb + old caption for redundancy
-            blurb = str(p.get("blurb") or "").strip()
-            caption_extra = blurb if blurb else (p.get("caption") or "")
-            price_text = f"{currency} {price:.2f}" if isinstance(price, (int, float)) else f"{currency} {price}"
-            emoji_pack = p.get("emojis") or ""
-            cap_body = html.escape(caption_extra)
-            if emoji_pack:
-                cap_body = f"{emoji_pack} {cap_body}"
-            caption = f"✅ <b>{title}</b> — {price_text}\n{cap_body}\n<a href=\"{url}\">View</a>"
-
-            if img:
-                requests.post(
-                    f"{api}/sendPhoto",
-                    data={
-                        "chat_id": chat_id,
+            for target in targets:
+                if img:
+                    transport.post(f"{api}/sendPhoto", json={
+                        "chat_id": target,
                         "photo": img,
                         "caption": caption,
                         "parse_mode": "HTML",
-                    },
-                    timeout=20,
-                )
-            else:
-                requests.post(
-                    f"{api}/sendMessage",
-                    data={
-                        "chat_id": chat_id,
+                    })
+                else:
+                    transport.post(f"{api}/sendMessage", json={
+                        "chat_id": target,
                         "text": caption,
                         "parse_mode": "HTML",
                         "disable_web_page_preview": True,
-                    },
-                    timeout=20,
-                )
+                    })
             # After each product message, maybe trigger CTA based on batch + cooldown
             try:
                 maybe_send_cta()
@@ -209,6 +370,24 @@ def post_telegram(products: List[Dict], limit=5):
             # best-effort; continue with next product
             continue
 
+
+def post_telegram(products: List[Dict], limit=5):
+    token = os.environ.get("TELEGRAM_BOT_TOKEN")
+    chat_id = os.environ.get("TELEGRAM_CHAT_ID")
+    if not token or not chat_id or not products:
+        return
+
+    pick = products[:limit]
+    targets = _telegram_targets(chat_id)
+    try:
+        queue = TelegramQueue(token)
+    except Exception as e:
+        # e.g. .cache unwritable or locked: still post, just without retries/dedupe
+        print(f"[telegram] outbox unavailable, sending directly: {e}")
+        _post_direct(token, targets, pick)
+    else:
+        _post_queued(queue, chat_id, targets, pick)
+
     # after posting, log a run summary
     try:
         uniq_topics = set()
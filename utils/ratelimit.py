@@ -0,0 +1,55 @@
+import threading, time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    `rate` is tokens (requests) per second, `burst` the bucket capacity.
+    A rate <= 0 disables limiting entirely.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate or 0.0)
+        self.capacity = max(1.0, float(burst if burst is not None else max(self.rate, 1.0)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Block until `tokens` are available; returns seconds spent waiting.
+        A request larger than the capacity waits for a full bucket and is then
+        charged in full: the balance goes negative and later callers wait off
+        the debt, so the long-run rate still holds.
+        """
+        if self.rate <= 0:
+            return 0.0
+        need = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= need:
+                    self._tokens -= tokens
+                    return waited
+                wait = (need - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
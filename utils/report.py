@@ -1,9 +1,10 @@
-import os, time, requests, csv
+import os, time, csv
 from pathlib import Path
 from trenddrop.utils.env_loader import load_env_once
 
 # Ensure root .env is loaded
 ENV_PATH = load_env_once()
+from utils.image_cache import get_image_bytes, prefetch
 from typing import List, Dict, Optional
 
 try:
@@ -66,12 +67,9 @@ def seller_fb_to_stars(seller_fb: Optional[object]) -> str:
 
 def _fetch_image_bytes(url: str) -> Optional[bytes]:
     try:
-        r = requests.get(url, timeout=12)
-        if r.status_code == 200 and r.content:
-            return r.content
+        return get_image_bytes(url, timeout=12)
     except Exception:
-        pass
-    return None
+        return None
 
 
 def generate_weekly_pdf(products: List[Dict], outfile_path: str) -> None:
@@ -103,7 +101,8 @@ def generate_weekly_pdf(products: List[Dict], outfile_path: str) -> None:
     c.drawString(72, 72, time.strftime("Generated %Y-%m-%d", time.gmtime()))
     c.showPage()
 
-    # Product pages (one per product for clarity)
+    # Product pages (one per product for clarity); images are fetched in parallel up front
+    prefetch([p.get("image_url") for p in products[:10]], timeout=12)
     for i, p in enumerate(products[:10], start=1):
         c.setFillColor(colors.black)
         c.setFont("Helvetica-Bold", 18)
@@ -0,0 +1,111 @@
+import os, json
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+# Score = top_rated bonus + capped seller feedback + price-band bonus + capped click signals.
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "top_rated": 5.0,
+    "feedback_div": 1000.0,
+    "feedback_cap": 5.0,
+    "signals_div": 1000.0,
+    "signals_cap": 5.0,
+}
+
+# (low, high, points), bounds inclusive, first matching band wins
+DEFAULT_PRICE_BANDS: List[Tuple[float, float, float]] = [
+    (15.0, 150.0, 4.0),
+    (5.0, 15.0, 2.0),
+    (150.0, 400.0, 1.0),
+]
+
+
+def _num(v) -> float:
+    try:
+        f = float(v or 0)
+        return f if f == f else 0.0  # NaN -> 0
+    except Exception:
+        return 0.0
+
+
+def load_weights() -> Dict[str, float]:
+    """DEFAULT_WEIGHTS overlaid with SCORE_WEIGHTS (JSON object) when set."""
+    weights = dict(DEFAULT_WEIGHTS)
+    try:
+        raw = os.environ.get("SCORE_WEIGHTS")
+        if raw:
+            weights.update({k: float(v) for k, v in json.loads(raw).items()})
+    except Exception:
+        pass
+    return weights
+
+
+def load_price_bands() -> List[Tuple[float, float, float]]:
+    """DEFAULT_PRICE_BANDS or SCORE_PRICE_BANDS (JSON list of [low, high, points])."""
+    try:
+        raw = os.environ.get("SCORE_PRICE_BANDS")
+        if raw:
+            return [(float(lo), float(hi), float(pts)) for lo, hi, pts in json.loads(raw)]
+    except Exception:
+        pass
+    return list(DEFAULT_PRICE_BANDS)
+
+
+def score_arrays(price, feedback, top_rated, signals,
+                 weights: Optional[Dict[str, float]] = None,
+                 bands: Optional[Sequence[Tuple[float, float, float]]] = None):
+    """Vectorized scoring over equal-length NumPy arrays; returns a float64 array."""
+    w = weights or load_weights()
+    bands = bands if bands is not None else load_price_bands()
+    price = np.asarray(price, dtype=np.float64)
+    out = np.where(np.asarray(top_rated, dtype=bool), w["top_rated"], 0.0)
+    out = out + np.minimum(np.asarray(feedback, dtype=np.float64) / w["feedback_div"], w["feedback_cap"])
+    out = out + np.minimum(np.asarray(signals, dtype=np.float64) / w["signals_div"], w["signals_cap"])
+    if bands:
+        conds = [(price >= lo) & (price <= hi) for lo, hi, _ in bands]
+        out = out + np.select(conds, [pts for _, _, pts in bands], 0.0)
+    return out
+
+
+def _score_python(p: Dict, w: Dict[str, float], bands: Sequence[Tuple[float, float, float]]) -> float:
+    s = w["top_rated"] if p.get("top_rated") else 0.0
+    s += min(_num(p.get("seller_feedback")) / w["feedback_div"], w["feedback_cap"])
+    s += min(_num(p.get("signals")) / w["signals_div"], w["signals_cap"])
+    price = _num(p.get("price"))
+    for lo, hi, pts in bands:
+        if lo <= price <= hi:
+            s += pts
+            break
+    return s
+
+
+def score_batch(items: Sequence[Dict],
+                weights: Optional[Dict[str, float]] = None,
+                bands: Optional[Sequence[Tuple[float, float, float]]] = None) -> List[float]:
+    """Score a batch of product dicts (price, seller_feedback, top_rated, signals)."""
+    w = weights or load_weights()
+    bands = bands if bands is not None else load_price_bands()
+    n = len(items)
+    if np is None or n == 0:
+        return [_score_python(p, w, bands) for p in items]
+    price = np.fromiter((_num(p.get("price")) for p in items), dtype=np.float64, count=n)
+    feedback = np.fromiter((_num(p.get("seller_feedback")) for p in items), dtype=np.float64, count=n)
+    top_rated = np.fromiter((bool(p.get("top_rated")) for p in items), dtype=bool, count=n)
+    signals = np.fromiter((_num(p.get("signals")) for p in items), dtype=np.float64, count=n)
+    return score_arrays(price, feedback, top_rated, signals, w, bands).tolist()
+
+
+def score_one(p: Dict) -> float:
+    return _score_python(p, load_weights(), load_price_bands())
+
+
+def rank(items: Sequence[Dict], scores: Optional[Iterable[float]] = None) -> List[Dict]:
+    """Items sorted by score, best first; ties keep input order."""
+    scores = list(scores) if scores is not None else score_batch(items)
+    if np is not None and scores:
+        order = np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")
+        return [items[i] for i in order]
+    return [items[i] for i in sorted(range(len(items)), key=lambda i: -scores[i])]
@@ -0,0 +1,135 @@
+import os, time, uuid, sqlite3, threading
+from typing import Dict, Iterable, List, Optional, Sequence
+from urllib.parse import urlsplit, urlunsplit
+
+from utils.db import _stable_product_id, _provider_from_source
+from trenddrop.utils.env_loader import env_float, env_flag
+
+# Cross-run "already posted" index. One row per product: 16-byte id (the same
+# uuid5 as the Supabase upsert, over the URL without affiliate/query params)
+# and the last time it was posted. WITHOUT ROWID keeps each row ~30 bytes in a
+# single primary-key B-tree; rows past the TTL or beyond the row cap are purged.
+# seen_images keeps the photo dHash of each posted listing for utils.phash.
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+_DEFAULT_PATH = os.path.join(_ROOT_DIR, ".cache", "seen", "posted.sqlite")
+_MASK64 = (1 << 64) - 1
+
+
+def _ttl_secs() -> float:
+    return env_float("SEEN_TTL_HOURS", 72.0) * 3600
+
+
+def _max_rows() -> int:
+    return int(env_float("SEEN_MAX_ROWS", 2_000_000))
+
+
+def seen_key(p: Dict) -> Optional[bytes]:
+    url = str(p.get("url") or "")
+    if not url:
+        return None
+    # affiliate params (campid, customid per topic) change between runs
+    parts = urlsplit(url)
+    bare = urlunsplit((parts.scheme, parts.netloc.lower(), parts.path.rstrip("/"), "", ""))
+    provider = _provider_from_source(p.get("provider") or p.get("source") or "manual")
+    return uuid.UUID(_stable_product_id(provider, bare)).bytes
+
+
+class SeenIndex:
+    def __init__(self, path: str = _DEFAULT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen (id BLOB PRIMARY KEY, ts INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS seen_ts ON seen (ts)")
+        # dHash of each posted listing's photo, so a reposted stock photo under a new URL is caught too
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen_images (id BLOB PRIMARY KEY, h INTEGER NOT NULL, ts INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def seen_keys(self, keys: Sequence[bytes]) -> set:
+        """Subset of `keys` posted within the TTL (one indexed lookup per key)."""
+        cutoff = int(time.time() - _ttl_secs())
+        out = set()
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = list(keys[start:start + 500])
+                marks = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT id FROM seen WHERE ts >= ? AND id IN ({marks})", [cutoff] + chunk
+                )
+                out.update(bytes(r[0]) for r in rows)
+        return out
+
+    def filter_unseen(self, items: Sequence[Dict]) -> List[Dict]:
+        if _ttl_secs() <= 0 or not items:
+            return list(items)
+        keys = [seen_key(p) for p in items]
+        seen = self.seen_keys([k for k in keys if k])
+        return [p for p, k in zip(items, keys) if not k or k not in seen]
+
+    def image_hashes(self) -> List[int]:
+        """dHashes of photos posted within the TTL."""
+        cutoff = int(time.time() - _ttl_secs())
+        with self._lock:
+            rows = self._db.execute("SELECT h FROM seen_images WHERE ts >= ?", (cutoff,)).fetchall()
+        # stored as signed 64-bit (SQLite INTEGER); back to the unsigned hash
+        return [int(r[0]) & _MASK64 for r in rows]
+
+    def mark(self, items: Iterable[Dict], image_hashes: Optional[Dict[str, int]] = None) -> int:
+        """Record `items` as posted now; `image_hashes` ({image_url: dHash}) are kept for cross-run image dedupe."""
+        now = int(time.time())
+        items = list(items)
+        keys = [seen_key(p) for p in items]
+        rows = [(k, now) for k in keys if k]
+        if not rows:
+            return 0
+        images = []
+        for p, k in zip(items, keys):
+            h = (image_hashes or {}).get(p.get("image_url") or "")
+            if k and h is not None:
+                images.append((k, h - (1 << 64) if h >= (1 << 63) else h, now))
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO seen (id, ts) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET ts = excluded.ts", rows
+            )
+            self._db.executemany(
+                "INSERT INTO seen_images (id, h, ts) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET h = excluded.h, ts = excluded.ts", images
+            )
+            self._db.commit()
+        return len(rows)
+
+    def prune(self) -> int:
+        """Drop expired rows, then the oldest beyond SEEN_MAX_ROWS; returns rows removed."""
+        cutoff = int(time.time() - _ttl_secs())
+        with self._lock:
+            removed = self._db.execute("DELETE FROM seen WHERE ts < ?", (cutoff,)).rowcount
+            excess = self._db.execute("SELECT COUNT(*) FROM seen").fetchone()[0] - _max_rows()
+            if excess > 0:
+                removed += self._db.execute(
+                    "DELETE FROM seen WHERE id IN (SELECT id FROM seen ORDER BY ts LIMIT ?)", (excess,)
+                ).rowcount
+            self._db.execute("DELETE FROM seen_images WHERE ts < ? OR NOT EXISTS (SELECT 1 FROM seen WHERE seen.id = seen_images.id)", (cutoff,))
+            self._db.commit()
+            if removed:
+                self._db.execute("PRAGMA incremental_vacuum")
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._db.execute("SELECT COUNT(*) FROM seen").fetchone()[0])
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def seen_enabled() -> bool:
+    return env_flag("SEEN_INDEX", True) and _ttl_secs() > 0
@@ -0,0 +1,153 @@
+import os, re, json, time, gzip, hashlib
+from typing import Dict, List, Optional, Tuple
+
+from utils.filelock import atomic_write_bytes
+from trenddrop.utils.env_loader import env_int
+
+try:
+    import brotli  # type: ignore
+except Exception:
+    brotli = None  # type: ignore
+
+# Static JSON published under docs/data for the GitHub Pages site. Files are
+# written compactly via temp file + rename, with precompressed .gz (and .br when
+# brotli is installed) sidecars, and carry a content "version" so unchanged
+# pick sets are not rewritten (no git churn, clients keep their cached copy).
+
+
+def dumps_compact(data) -> bytes:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def content_version(data) -> str:
+    """Short hash of the canonical JSON of `data` (key order does not matter)."""
+    canonical = json.dumps(data, separators=(",", ":"), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _existing_version(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except Exception:
+        return None
+
+
+def _write_sidecar(path: str, data: Optional[bytes]) -> None:
+    if data is None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return
+    atomic_write_bytes(path, data)
+
+
+def write_published(path: str, payload: bytes) -> bool:
+    """Atomically write `payload` and its compressed sidecars; False if the main file failed."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not atomic_write_bytes(path, payload):
+        return False
+    # mtime=0 keeps the .gz byte-identical for identical payloads
+    _write_sidecar(path + ".gz", gzip.compress(payload, compresslevel=9, mtime=0))
+    _write_sidecar(path + ".br", brotli.compress(payload, quality=11) if brotli is not None else None)
+    return True
+
+
+def remove_published(path: str) -> None:
+    for p in (path, path + ".gz", path + ".br"):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+def publish_versioned(path: str, body: Dict, force: bool = False) -> Tuple[str, str]:
+    """
+    Write {"version", "updated_at", **body} to `path` unless the file already
+    holds the same version. Returns (version, status), status being
+    "written", "unchanged" or "failed".
+    """
+    version = content_version(body)
+    if not force and _existing_version(path) == version:
+        return version, "unchanged"
+    payload = dict(version=version, updated_at=int(time.time()), **body)
+    return version, "written" if write_published(path, dumps_compact(payload)) else "failed"
+
+
+def publish_products(path: str, products: List[Dict]) -> Tuple[str, str]:
+    return publish_versioned(path, {"products": products})
+
+
+def _slug(tag: str) -> str:
+    s = re.sub(r"[^a-z0-9]+", "-", str(tag).lower()).strip("-")[:60]
+    # keep distinct tags that normalise to the same text apart
+    return f"{s or 'tag'}-{hashlib.sha1(str(tag).encode('utf-8')).hexdigest()[:6]}"
+
+
+def _page_size() -> int:
+    return max(1, env_int("SITE_PAGE_SIZE", 24))
+
+
+def _prune_shards(directory: str, keep: set) -> int:
+    """Remove shards (and sidecars) in `directory` that are not in `keep`; returns files removed."""
+    removed = 0
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    for name in names:
+        base = name[:-3] if name.endswith((".gz", ".br")) else name
+        if base.endswith(".json") and base not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def publish_catalog(data_dir: str, products: List[Dict], page_size: Optional[int] = None) -> Dict:
+    """
+    Sharded catalog for the site:
+      index.json           manifest (page/tag shard paths + versions), always small
+      pages/page-NNNN.json fixed-size pages in rank order
+      tags/<slug>.json     every product carrying that tag
+    Each shard is rewritten only when its own content version changed, and
+    shards that no longer exist are deleted. Returns written/unchanged/failed/removed counts.
+    """
+    page_size = page_size or _page_size()
+    stats = {"written": 0, "unchanged": 0, "failed": 0, "removed": 0}
+
+    def _put(path: str, body: Dict) -> str:
+        version, status = publish_versioned(path, body)
+        stats[status] += 1
+        return version
+
+    pages = []
+    page_names = set()
+    for n, start in enumerate(range(0, len(products), page_size), start=1):
+        name = f"page-{n:04d}.json"
+        chunk = products[start:start + page_size]
+        version = _put(os.path.join(data_dir, "pages", name), {"page": n, "products": chunk})
+        pages.append({"path": f"pages/{name}", "version": version, "count": len(chunk)})
+        page_names.add(name)
+
+    by_tag: Dict[str, List[Dict]] = {}
+    for p in products:
+        for tag in dict.fromkeys(t for t in (p.get("tags") or []) if t):
+            by_tag.setdefault(str(tag), []).append(p)
+    tags = []
+    tag_names = set()
+    for tag, items in sorted(by_tag.items(), key=lambda kv: (-len(kv[1]), kv[0])):
+        name = f"{_slug(tag)}.json"
+        version = _put(os.path.join(data_dir, "tags", name), {"tag": tag, "products": items})
+        tags.append({"tag": tag, "path": f"tags/{name}", "version": version, "count": len(items)})
+        tag_names.add(name)
+
+    _put(os.path.join(data_dir, "index.json"),
+         {"page_size": page_size, "total": len(products), "pages": pages, "tags": tags})
+    # only once the new manifest is in place
+    stats["removed"] += _prune_shards(os.path.join(data_dir, "pages"), page_names)
+    stats["removed"] += _prune_shards(os.path.join(data_dir, "tags"), tag_names)
+    return stats
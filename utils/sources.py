@@ -1,11 +1,14 @@
-import os, time, json, hashlib, pathlib
+import os, time, hashlib, pathlib, threading
 from pathlib import Path
-from trenddrop.utils.env_loader import load_env_once
+from trenddrop.utils.env_loader import load_env_once, env_float, env_flag
 
 # Ensure root .env is loaded
 ENV_PATH = load_env_once()
-from typing import List, Dict
-from utils.ebay_browse import search_browse
+from typing import List, Dict, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor
+from utils.ebay_browse import search_browse, iter_browse, DEFAULT_MARKETPLACE
+from utils.ebay_budget import budget_allows, budget_status
+from utils.filelock import read_json, atomic_write_json
 
 def _debug_enabled() -> bool:
     try:
@@ -30,66 +33,178 @@ def _is_rate_limited(resp_json) -> bool:
     except Exception:
         return False
 
-# ---------- Simple file cache & daily budget ----------
+# ---------- Simple file cache (daily budget lives in utils.ebay_budget) ----------
 _ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
 _CACHE_DIR = os.path.join(_ROOT_DIR, ".cache", "ebay")
 
-def _ensure_cache_dir():
+def _ensure_cache_dir(path: str = _CACHE_DIR):
     try:
-        pathlib.Path(_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+        pathlib.Path(path).mkdir(parents=True, exist_ok=True)
     except Exception:
         pass
 
+_CACHE_REQUEST_VERSION = "browse-v1"
+_CACHE_STATS: Dict[str, int] = {"hit": 0, "stale": 0, "miss": 0, "write": 0, "evicted": 0, "budget": 0}
+_CACHE_LOCK = threading.Lock()
+_REVALIDATING: set = set()
+_REVALIDATE_POOL: Optional[ThreadPoolExecutor] = None
+
 def _cache_enabled() -> bool:
     try:
-        ttl_min = float(os.environ.get("EBAY_CACHE_TTL_MIN", 0))
-        bypass = str(os.environ.get("EBAY_CACHE_BYPASS", "")).lower() in ("1", "true", "yes")
+        ttl_min = env_float("EBAY_CACHE_TTL_MIN", 45.0)
+        bypass = env_flag("EBAY_CACHE_BYPASS", False)
         return (ttl_min > 0) and (not bypass)
     except Exception:
         return False
 
 def _cache_ttl_secs() -> float:
-    try:
-        return float(os.environ.get("EBAY_CACHE_TTL_MIN", 0)) * 60.0
-    except Exception:
-        return 0.0
+    return env_float("EBAY_CACHE_TTL_MIN", 45.0) * 60.0
+
+def _cache_stale_secs() -> float:
+    # how long past the TTL an entry may still be served while it is refreshed in the background
+    return env_float("EBAY_CACHE_STALE_MIN", 120.0) * 60.0
+
+def _cache_max_bytes() -> int:
+    return int(env_float("EBAY_CACHE_MAX_MB", 50.0) * 1024 * 1024)
 
 def _cache_key(keyword: str, per_page: int, global_id: str, request_version: str) -> str:
     raw = f"{keyword}|{per_page}|{global_id}|{request_version}"
     return hashlib.md5(raw.encode("utf-8")).hexdigest()
 
+def _cache_namespace(marketplace: str) -> str:
+    # one subdirectory per marketplace so entries never collide and can be cleared independently
+    return os.path.join(_CACHE_DIR, marketplace.lower())
+
+def _cache_path(key: str, marketplace: str = DEFAULT_MARKETPLACE) -> str:
+    return os.path.join(_cache_namespace(marketplace), f"{key}.json")
+
 def _cache_read(path: str):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return None
+    return read_json(path, None)
 
 def _cache_write(path: str, data) -> None:
+    # temp file + rename so readers never see a partial entry
+    atomic_write_json(path, data)
+
+def _cache_count(name: str, n: int = 1) -> None:
+    with _CACHE_LOCK:
+        _CACHE_STATS[name] = _CACHE_STATS.get(name, 0) + n
+
+def cache_stats() -> Dict[str, int]:
+    with _CACHE_LOCK:
+        return dict(_CACHE_STATS)
+
+def _cache_evict() -> None:
+    """Drop the oldest entries until the cache directory fits in EBAY_CACHE_MAX_MB."""
+    limit = _cache_max_bytes()
+    if limit <= 0:
+        return
+    entries = []
+    total = 0
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f)
+        # response entries live in the per-marketplace subdirectories; top-level
+        # files (budget, oauth token, locks) are never evicted
+        with os.scandir(_CACHE_DIR) as top:
+            namespaces = [d.path for d in top if d.is_dir()]
+        for ns in namespaces:
+            with os.scandir(ns) as it:
+                for e in it:
+                    if not e.is_file() or not e.name.endswith(".json"):
+                        continue
+                    st = e.stat()
+                    entries.append((st.st_mtime, st.st_size, e.path))
+                    total += st.st_size
     except Exception:
-        pass
+        return
+    if total <= limit:
+        return
+    entries.sort()
+    evicted = 0
+    for _mtime, size, path in entries:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            evicted += 1
+        except Exception:
+            continue
+    if evicted:
+        _cache_count("evicted", evicted)
 
-def _budget_path() -> str:
-    return os.path.join(_CACHE_DIR, "budget.json")
+def _fetch_and_store(keyword: str, per_page: int, path: str, marketplace: str) -> List[Dict]:
+    items = search_browse(keyword, limit=per_page, marketplace=marketplace)
+    # empty results are indistinguishable from a failed call; never cache them
+    if items:
+        _cache_write(path, {"ts": time.time(), "keyword": keyword, "per_page": per_page,
+                            "marketplace": marketplace, "items": items})
+        _cache_count("write")
+        _cache_evict()
+    return items
 
-def _load_budget():
-    path = _budget_path()
+def _revalidate(keyword: str, per_page: int, path: str, marketplace: str) -> None:
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {"date": "", "count": 0}
+        _fetch_and_store(keyword, per_page, path, marketplace)
+    except Exception as e:
+        print(f"[cache] revalidate failed '{keyword}': {e}")
+    finally:
+        with _CACHE_LOCK:
+            _REVALIDATING.discard(path)
+
+def _revalidate_async(keyword: str, per_page: int, path: str, marketplace: str) -> None:
+    global _REVALIDATE_POOL
+    with _CACHE_LOCK:
+        if path in _REVALIDATING:
+            return
+        _REVALIDATING.add(path)
+        if _REVALIDATE_POOL is None:
+            _REVALIDATE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ebay-revalidate")
+        pool = _REVALIDATE_POOL
+    pool.submit(_revalidate, keyword, per_page, path, marketplace)
+
+def search_ebay(keyword: str, per_page: int = 12, marketplace: str = DEFAULT_MARKETPLACE) -> List[Dict]:
+    # Prefer Browse API (far better quotas); per_page maps to limit.
+    if not _cache_enabled():
+        return search_browse(keyword, limit=per_page, marketplace=marketplace)
+
+    _ensure_cache_dir(_cache_namespace(marketplace))
+    path = _cache_path(_cache_key(keyword, per_page, marketplace, _CACHE_REQUEST_VERSION), marketplace)
+    entry = _cache_read(path)
+    cached = entry.get("items") if isinstance(entry, dict) else None
+    if isinstance(cached, list):
+        age = time.time() - float(entry.get("ts") or 0)
+        ttl = _cache_ttl_secs()
+        if age <= ttl:
+            _cache_count("hit")
+            if _debug_enabled():
+                print(f"[cache] hit '{keyword}' age={int(age)}s")
+            return cached
+        if age <= ttl + _cache_stale_secs():
+            _cache_count("stale")
+            if _debug_enabled():
+                print(f"[cache] stale '{keyword}' age={int(age)}s; revalidating")
+            if budget_allows():
+                _revalidate_async(keyword, per_page, path, marketplace)
+            return cached
+
+    if not budget_allows():
+        # out of live calls for now: any cached copy, however old, beats nothing
+        _cache_count("budget")
+        print(f"[cache] budget exhausted; serving {'cached' if isinstance(cached, list) else 'no'} results for '{keyword}' ({budget_status()})")
+        return cached if isinstance(cached, list) else []
 
-def _save_budget(data) -> None:
+    _cache_count("miss")
     try:
-        with open(_budget_path(), "w", encoding="utf-8") as f:
-            json.dump(data, f)
+        items = _fetch_and_store(keyword, per_page, path, marketplace)
     except Exception:
-        pass
+        if isinstance(cached, list):
+            return cached
+        raise
+    if not items and isinstance(cached, list):
+        # live call failed or came back empty: an expired entry beats nothing
+        return cached
+    return items
 
-def search_ebay(keyword: str, per_page: int = 12) -> List[Dict]:
-    # Prefer Browse API (far better quotas); per_page maps to limit.
-    return search_browse(keyword, limit=per_page)
+def iter_ebay(keyword: str, max_items: Optional[int] = None, page_size: int = 200,
+              marketplace: str = DEFAULT_MARKETPLACE) -> Iterator[Dict]:
+    """Deep sweep for one keyword: streams live Browse pages (uncached) in bounded memory."""
+    return iter_browse(keyword, page_size=page_size, max_items=max_items, marketplace=marketplace)
@@ -0,0 +1,52 @@
+import heapq
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class TopK:
+    """
+    Streaming dedupe + top-K selection.
+
+    Items are offered one at a time; the first item seen for a key wins (same
+    as `dedupe`), and only the K best-scored survivors are kept in a min-heap.
+    Memory is O(K + distinct keys) regardless of how many items stream through.
+    Ties keep the earlier item, matching a stable descending sort.
+    """
+
+    def __init__(self, k: int, key: Callable[[Dict], Optional[Hashable]] = lambda p: p.get("url")):
+        self.k = max(0, int(k))
+        self._key = key
+        self._heap: List[Tuple[float, int, Dict]] = []
+        self._seen = set()
+        self._seq = 0
+        self.offered = 0
+        self.duplicates = 0
+
+    def offer(self, item: Dict, score: float) -> bool:
+        """Returns True if the item is currently among the top K."""
+        self.offered += 1
+        key = self._key(item)
+        if not key or key in self._seen:
+            self.duplicates += 1
+            return False
+        self._seen.add(key)
+        self._seq += 1
+        # (score, -seq) is unique, so dicts are never compared
+        entry = (float(score or 0.0), -self._seq, item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if self.k and entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def items(self) -> List[Dict]:
+        """Current picks, best first (safe to call at any point while streaming)."""
+        return [e[2] for e in sorted(self._heap, key=lambda e: (-e[0], -e[1]))]
+
+    @property
+    def distinct(self) -> int:
+        return len(self._seen)
+
+    def __len__(self) -> int:
+        return len(self._heap)
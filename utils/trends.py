@@ -1,10 +1,13 @@
-import random
+import os, random, time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv, find_dotenv
 
 # Ensure root .env is loaded (pytrends may not need it, but keep consistent)
 load_dotenv(find_dotenv(usecwd=True), override=False)
-from typing import List
+from typing import List, Dict, Optional
 from pytrends.request import TrendReq
+from utils.filelock import read_json, atomic_write_json
+from trenddrop.utils.env_loader import env_float
 
 SEED_TOPICS = [
     "desk lamp","pickleball paddle","massage gun","wireless charger",
@@ -19,15 +22,73 @@ def clean_topic(t: str) -> str:
         return ""
     return t
 
-def top_topics(limit: int = 8, geo: str = "US") -> List[str]:
+_ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+_CACHE_DIR = os.path.join(_ROOT_DIR, ".cache", "trends")
+
+# pytrends `pn` names for trending_searches
+_GEO_PN = {"US": "united_states", "GB": "united_kingdom", "UK": "united_kingdom", "DE": "germany"}
+
+def _ttl_secs() -> float:
+    return env_float("TRENDS_CACHE_TTL_MIN", 60.0) * 60.0
+
+def _snapshot_path(geo: str) -> str:
+    return os.path.join(_CACHE_DIR, f"{geo.lower()}.json")
+
+def _fetch_live(geo: str) -> List[str]:
+    pytrends = TrendReq(hl='en-US', tz=360)
+    df = pytrends.trending_searches(pn=_GEO_PN[geo])
+    topics = [clean_topic(x) for x in df[0].tolist()]
+    topics = [x for x in topics if x]
+    if not topics:
+        raise ValueError(f"no usable trending topics for {geo}")
+    return topics
+
+def _topics_for_geo(geo: str) -> List[str]:
+    """
+    Fresh snapshot within TRENDS_CACHE_TTL_MIN -> no network at all.
+    Otherwise fetch live and store a new snapshot; if Google throttles or
+    fails, fall back to the last good snapshot, and only then to the seeds.
+    """
+    path = _snapshot_path(geo)
+    snap: Optional[Dict] = read_json(path, None)
+    cached = snap.get("topics") if isinstance(snap, dict) else None
+    if cached and time.time() - float(snap.get("ts") or 0) <= _ttl_secs():
+        return list(cached)
     try:
-        pytrends = TrendReq(hl='en-US', tz=360)
-        df = pytrends.trending_searches(pn='united_states' if geo.upper()=="US" else 'united_kingdom')
-        topics = [clean_topic(x) for x in df[0].tolist()]
-        topics = [x for x in topics if x]
-        if not topics:
-            topics = SEED_TOPICS[:]
-    except Exception:
+        topics = _fetch_live(geo)
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        atomic_write_json(path, {"ts": time.time(), "geo": geo, "topics": topics})
+        return topics
+    except Exception as e:
+        if cached:
+            print(f"[trends] live fetch failed for {geo} ({e}); using snapshot from {time.strftime('%Y-%m-%d %H:%M', time.gmtime(float(snap.get('ts') or 0)))}")
+            return list(cached)
+        print(f"[trends] live fetch failed for {geo} ({e}); using seed topics")
+        return SEED_TOPICS[:]
+
+def top_topics(limit: int = 8, geo: str = "US") -> List[str]:
+    """`geo` may list several comma-separated geos (e.g. "US,GB"); they are fetched in parallel."""
+    geos = list(dict.fromkeys(g.strip().upper() for g in (geo or "US").split(",") if g.strip())) or ["US"]
+    unknown = [g for g in geos if g not in _GEO_PN]
+    if unknown:
+        # pytrends has no trending feed mapped for these; don't cache another geo's topics under their name
+        print(f"[trends] skipping unsupported geo(s) {','.join(unknown)}; supported: {','.join(_GEO_PN)}")
+        geos = [g for g in geos if g in _GEO_PN]
+    if not geos:
         topics = SEED_TOPICS[:]
+        random.shuffle(topics)
+        return topics[:limit]
+    if len(geos) == 1:
+        per_geo = [_topics_for_geo(geos[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(geos)) as pool:
+            per_geo = list(pool.map(_topics_for_geo, geos))
+    topics: List[str] = []
+    seen = set()
+    for batch in per_geo:
+        for t in batch:
+            if t.lower() not in seen:
+                seen.add(t.lower())
+                topics.append(t)
     random.shuffle(topics)
     return topics[:limit]